@@ -0,0 +1,50 @@
+"""
+Latency-bounded alternative routes.
+
+nx.shortest_simple_paths (Yen's algorithm) runs a shortest-path search per
+spur node of every accepted route, which can stall a worker for seconds. The
+penalty method used here runs one Dijkstra per candidate instead: after each
+route is found, the weights of its edges are inflated so the next search is
+pushed onto different roads. Routes that are too long compared to the best
+one, or repeat an earlier route, are dropped.
+"""
+import time
+
+import networkx as nx
+
+
+def alternative_routes(G, source, target, max_routes=5, time_budget=0.5, penalty=1.5, max_stretch=1.6, weight="weight"):
+    """
+    Returns up to ``max_routes`` distinct node paths from ``source`` to
+    ``target``, shortest first. Stops early once ``time_budget`` seconds have
+    been spent; the shortest path is always returned. ``max_stretch`` bounds
+    a route's true length relative to the shortest. Raises nx.NetworkXNoPath
+    when the nodes are not connected.
+    """
+    deadline = time.monotonic() + time_budget
+    penalties = {}
+
+    def penalized(u, v, data):
+        return data[weight] * penalties.get(frozenset((u, v)), 1.0)
+
+    routes, seen = [], set()
+    shortest_length = None
+    # Each attempt inflates at least one edge, so a few spare attempts are
+    # enough to get past repeats before giving up.
+    for _ in range(max_routes * 3):
+        path = nx.dijkstra_path(G, source, target, weight=penalized)
+        edges = [frozenset(edge) for edge in zip(path, path[1:])]
+        length = sum(G[u][v][weight] for u, v in zip(path, path[1:]))
+        if shortest_length is None:
+            shortest_length = length
+
+        key = tuple(path)
+        if key not in seen and length <= shortest_length * max_stretch:
+            seen.add(key)
+            routes.append(path)
+        if len(routes) >= max_routes or time.monotonic() >= deadline or not edges:
+            break
+
+        for edge in edges:
+            penalties[edge] = penalties.get(edge, 1.0) * penalty
+    return routes
@@ -0,0 +1,235 @@
+"""
+Bulk population of the cached datasets (CachedRoad, DITCachedBuildings).
+
+Rows are read from the OSM tables in one query and written with batched
+``bulk_create(update_conflicts=True)`` upserts inside a single transaction,
+instead of one update_or_create (two queries) per row. bulk_create does not
+send post_save, so each fill records itself on the dataset's CachedDataset
+row (fill time, bbox, source rows) and bumps its version once, for the graph
+store and payload cache to pick up the new rows.
+
+Fills run outside user requests: the warm_caches command, or a background
+thread started by the first request that finds a dataset cold. A PostgreSQL
+advisory lock per dataset makes them single-flight across all workers; while
+a fill runs, readers keep serving the rows already committed (or a "warming"
+response when there are none yet). A fill that fails is not retried by this
+worker until a backoff, doubling with each consecutive failure, has passed.
+"""
+import logging
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from django.contrib.gis.geos import GEOSGeometry
+from django.db import connection, transaction
+
+from .lod import LOD_COLUMNS
+from .models import CachedDataset, CachedRoad, DITCachedBuildings
+from .osm_queries import iter_buildings, iter_highway_ways
+from .payloads import DATASET_MODELS
+from .viewport import CASE_STUDY_BBOX, UNIVERSITY_BLOCKS_BBOX, Viewport
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+ROAD_FILL_LIMIT = 2000
+BUILDING_FILL_LIMIT = 5000
+
+# Seconds before a failed background fill is retried; doubles per consecutive failure
+FAILURE_BACKOFF = 30
+FAILURE_BACKOFF_MAX = 15 * 60
+
+
+class FillResult:
+    """Outcome of one cache fill."""
+
+    def __init__(self, dataset, rows, seconds):
+        self.dataset = dataset
+        self.rows = rows
+        self.seconds = seconds
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return f"{self.dataset}: {self.rows} rows in {self.seconds:.2f}s ({self.rows_per_second:.0f} rows/s)"
+
+
+def _unique_by_osm_id(rows):
+    """
+    ``rows`` with one row per osm_id, the last one winning. planet_osm_line /
+    planet_osm_polygon can hold several rows per id (split ways, multipolygon
+    members), and one upsert statement cannot update the same row twice.
+    """
+    return list({row[0]: row for row in rows}.values())
+
+
+def bulk_upsert(model, rows, batch_size=BATCH_SIZE):
+    """
+    Inserts or updates (osm_id, name, GeoJSON) rows into ``model`` keyed on
+    osm_id, ``batch_size`` rows per statement, with their simplified per-zoom
+    copies (bulk_create skips save()). Returns the number of rows written.
+    """
+    objects = [
+        model(osm_id=osm_id, name=name, geometry=GEOSGeometry(geojson, srid=4326))
+        for osm_id, name, geojson in _unique_by_osm_id(row for row in rows if row[2])
+    ]
+    for obj in objects:
+        obj.set_lods()
+    model.objects.bulk_create(
+        objects,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["osm_id"],
+        update_fields=["name", "geometry", *LOD_COLUMNS],
+    )
+    return len(objects)
+
+
+def _fill(dataset, model, area, rows, started):
+    rows = _unique_by_osm_id(rows)
+    with transaction.atomic():
+        count = bulk_upsert(model, rows)
+        CachedDataset.record_fill(dataset, bbox=area.envelope, source_rows=len(rows))
+    result = FillResult(dataset, count, time.perf_counter() - started)
+    logger.info("Filled %s", result)
+    return result
+
+
+def fill_roads(area=None, limit=ROAD_FILL_LIMIT):
+    """Fills CachedRoad with the highways in ``area`` (a Viewport; the case-study area by default)."""
+    started = time.perf_counter()
+    area = area or Viewport(*CASE_STUDY_BBOX)
+    rows = iter_highway_ways(area, limit)
+    return _fill(
+        CachedDataset.ROADS, CachedRoad, area,
+        [(osm_id, name or "Unnamed Road", geojson) for osm_id, name, geojson in rows],
+        started,
+    )
+
+
+def fill_buildings(area=None, limit=BUILDING_FILL_LIMIT):
+    """Fills DITCachedBuildings with the buildings in ``area`` (the university blocks area by default)."""
+    started = time.perf_counter()
+    area = area or Viewport(*UNIVERSITY_BLOCKS_BBOX)
+    rows = iter_buildings(area, limit)
+    return _fill(
+        CachedDataset.BUILDINGS, DITCachedBuildings, area,
+        [(osm_id, name, geojson) for osm_id, name, _landuse, _building, geojson in rows],
+        started,
+    )
+
+
+# dataset name -> fill function
+FILLERS = {
+    CachedDataset.ROADS: fill_roads,
+    CachedDataset.BUILDINGS: fill_buildings,
+}
+
+
+def _lock_key(dataset):
+    """Stable 32-bit advisory lock key for ``dataset``."""
+    return zlib.crc32(f"navigation.cache_fill.{dataset}".encode("utf-8"))
+
+
+@contextmanager
+def single_flight(dataset, wait=False):
+    """
+    Holds the dataset's advisory lock for the block and yields True, or
+    yields False straight away when another session holds it (unless ``wait``).
+    """
+    key = _lock_key(dataset)
+    with connection.cursor() as cursor:
+        if wait:
+            cursor.execute("SELECT pg_advisory_lock(%s)", [key])
+            acquired = True
+        else:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", [key])
+            acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [key])
+
+
+def warm(dataset, wait=False, force=False):
+    """
+    Fills ``dataset`` unless another process is already filling it or, unless
+    ``force``, it turns out to be filled once the lock is held (another
+    worker's fill committed after this one saw it cold). Returns the
+    FillResult, or None when the fill was skipped.
+    """
+    with single_flight(dataset, wait=wait) as acquired:
+        if not acquired:
+            logger.info("%s cache is already being warmed elsewhere; skipping.", dataset)
+            return None
+        if not force and CachedDataset.is_filled(dataset):
+            logger.info("%s cache was filled elsewhere meanwhile; skipping.", dataset)
+            return None
+        return FILLERS[dataset]()
+
+
+_warming = set()
+_failures = {}  # dataset -> (consecutive failures, time.monotonic() of the last one)
+_warming_lock = threading.Lock()
+
+
+def retry_after(dataset):
+    """Seconds until a failed fill of ``dataset`` may be retried by this worker; 0 when it may run now."""
+    with _warming_lock:
+        failure = _failures.get(dataset)
+    if failure is None:
+        return 0
+    count, failed_at = failure
+    backoff = min(FAILURE_BACKOFF * 2 ** (count - 1), FAILURE_BACKOFF_MAX)
+    return max(0, int(failed_at + backoff - time.monotonic()) + 1)
+
+
+def _warm_and_close(dataset):
+    try:
+        warm(dataset)
+    except Exception:
+        logger.exception("Background warm-up of the %s cache failed.", dataset)
+        with _warming_lock:
+            count, _ = _failures.get(dataset, (0, 0.0))
+            _failures[dataset] = (count + 1, time.monotonic())
+    else:
+        with _warming_lock:
+            _failures.pop(dataset, None)
+    finally:
+        with _warming_lock:
+            _warming.discard(dataset)
+        # Threads get their own connection; don't leak it
+        connection.close()
+
+
+def warm_in_background(dataset):
+    """
+    Starts a warm-up thread for ``dataset`` unless this process already runs
+    one or its last fill failed less than the backoff ago (see retry_after).
+    """
+    if retry_after(dataset):
+        return
+    with _warming_lock:
+        if dataset in _warming:
+            return
+        _warming.add(dataset)
+    threading.Thread(target=_warm_and_close, args=(dataset,), name=f"warm-{dataset}", daemon=True).start()
+
+
+def ensure_warm(dataset):
+    """
+    True when ``dataset`` can be served: it has been filled (see
+    CachedDataset.is_filled), even if the fill found few or no rows, or it
+    still holds rows written before. Otherwise it is warmed in the background
+    and False tells the caller to answer "warming"; a dataset that has rows
+    but no recorded fill is warmed too, while its rows are served.
+    """
+    if CachedDataset.is_filled(dataset):
+        return True
+    warm_in_background(dataset)
+    return DATASET_MODELS[dataset].objects.exists()
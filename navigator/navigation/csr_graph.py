@@ -0,0 +1,173 @@
+"""
+Array-backed routing engine.
+
+CSRGraph stores the road network with integer node IDs in NumPy CSR arrays
+(offsets/targets/weights) plus a coordinate array, and answers shortest-path
+queries with A* under a haversine heuristic. It is built from the same
+vertex-level graph as the NetworkX engine and returns the same coordinate
+lists, so the views can switch engines via settings.ROUTING_ENGINE.
+
+The arrays are not rebuilt when the graph changes: ``update`` reweights
+edges in place (removed ones get an infinite weight) and keeps new nodes and
+edges in a small adjacency overlay that A* reads alongside the arrays.
+"""
+import heapq
+
+import networkx as nx
+import numpy as np
+
+from .geodesy import haversine
+
+
+class CSRGraph:
+    """
+    Undirected road network in compressed sparse row form: the neighbours of
+    node ``i`` are ``targets[offsets[i]:offsets[i + 1]]`` with matching
+    ``weights``; ``coords[i]`` is its (lon, lat).
+    """
+
+    def __init__(self, nodes, coords, offsets, targets, weights):
+        self._ids = {node: i for i, node in enumerate(nodes)}
+        self.coords = coords
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self._csr_nodes = len(coords)  # Nodes past this have no CSR row
+        self._overlay = {}  # node ID -> {neighbour ID: weight} for edges not in the arrays
+        self.heuristic_scale = self._heuristic_scale()
+
+    @classmethod
+    def from_networkx(cls, G):
+        nodes = list(G.nodes())
+        ids = {node: i for i, node in enumerate(nodes)}
+        coords = np.array([node[:2] for node in nodes], dtype=np.float64).reshape(-1, 2)
+
+        degrees = np.fromiter((len(G[node]) for node in nodes), dtype=np.int64, count=len(nodes))
+        offsets = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(degrees, out=offsets[1:])
+        targets = np.fromiter(
+            (ids[nbr] for node in nodes for nbr in G[node]), dtype=np.int32, count=offsets[-1]
+        )
+        weights = np.fromiter(
+            (data["weight"] for node in nodes for data in G[node].values()), dtype=np.float64, count=offsets[-1]
+        )
+        return cls(nodes, coords, offsets, targets, weights)
+
+    def number_of_nodes(self):
+        return len(self.coords)
+
+    def number_of_edges(self):
+        return (int(np.isfinite(self.weights).sum()) + self.overlay_size()) // 2
+
+    def overlay_size(self):
+        """Number of edge entries held outside the CSR arrays."""
+        return sum(len(neighbours) for neighbours in self._overlay.values())
+
+    def update(self, G, pairs):
+        """
+        Brings the (u, v) node ``pairs`` in line with their current state in
+        ``G``, the graph this was built from: edges G no longer has are
+        removed and new or reweighted ones set, without rebuilding the arrays.
+        """
+        for u, v in pairs:
+            weight = G[u][v]["weight"] if G.has_edge(u, v) else np.inf
+            if weight == np.inf and (u not in self._ids or v not in self._ids):
+                continue
+            a, b = self._node_id(u), self._node_id(v)
+            self._set_weight(a, b, weight)
+            self._set_weight(b, a, weight)
+            if weight < np.inf:
+                length = float(haversine(*self.coords[a], *self.coords[b]))
+                if length > 0:
+                    self.heuristic_scale = min(self.heuristic_scale or 1.0, weight / length)
+
+    def _node_id(self, node):
+        """The ID of ``node``, appending it to the coordinates if it is new."""
+        if node not in self._ids:
+            self._ids[node] = len(self.coords)
+            self.coords = np.vstack([self.coords, np.asarray(node[:2], dtype=np.float64)])
+        return self._ids[node]
+
+    def _set_weight(self, a, b, weight):
+        """Sets the weight of a -> b (np.inf removes it), in the arrays where it has a slot."""
+        if a < self._csr_nodes:
+            lo, hi = self.offsets[a], self.offsets[a + 1]
+            slot = np.nonzero(self.targets[lo:hi] == b)[0]
+            if len(slot):
+                self.weights[lo + slot[0]] = weight
+                return
+        if weight < np.inf:
+            self._overlay.setdefault(a, {})[b] = weight
+        elif a in self._overlay:
+            self._overlay[a].pop(b, None)
+
+    def _heuristic_scale(self):
+        """
+        Largest factor that keeps ``scale * haversine`` a lower bound on edge
+        weights, so the heuristic stays admissible whatever unit the weights
+        are in (1.0 for weights in metres).
+        """
+        if not len(self.targets):
+            return 0.0
+        sources = np.repeat(np.arange(len(self.coords)), np.diff(self.offsets))
+        a, b = self.coords[sources], self.coords[self.targets]
+        lengths = haversine(a[:, 0], a[:, 1], b[:, 0], b[:, 1])
+        positive = lengths > 0
+        if not positive.any():
+            return 0.0
+        return float(min(1.0, np.min(self.weights[positive] / lengths[positive])))
+
+    def astar(self, source, target):
+        """
+        A* from node ID ``source`` to ``target``. Returns the list of node IDs
+        on the path; raises nx.NetworkXNoPath when target is unreachable.
+        """
+        n = len(self.coords)
+        tx, ty = self.coords[target]
+        h = haversine(self.coords[:, 0], self.coords[:, 1], tx, ty) * self.heuristic_scale
+        dist = np.full(n, np.inf)
+        prev = np.full(n, -1, dtype=np.int64)
+        closed = np.zeros(n, dtype=bool)
+        dist[source] = 0.0
+        heap = [(h[source], source)]
+
+        while heap:
+            _, u = heapq.heappop(heap)
+            if closed[u]:
+                continue
+            if u == target:
+                break
+            closed[u] = True
+
+            if u < self._csr_nodes:
+                lo, hi = self.offsets[u], self.offsets[u + 1]
+                nbrs = self.targets[lo:hi]
+                candidate = dist[u] + self.weights[lo:hi]
+                better = candidate < dist[nbrs]
+                if better.any():
+                    nbrs, candidate = nbrs[better], candidate[better]
+                    dist[nbrs] = candidate
+                    prev[nbrs] = u
+                    for v, f in zip(nbrs.tolist(), (candidate + h[nbrs]).tolist()):
+                        heapq.heappush(heap, (f, v))
+            for v, weight in self._overlay.get(u, {}).items():
+                if dist[u] + weight < dist[v]:
+                    dist[v] = dist[u] + weight
+                    prev[v] = u
+                    heapq.heappush(heap, (dist[v] + h[v], v))
+        else:
+            raise nx.NetworkXNoPath(f"No path between node {source} and node {target}.")
+
+        path = [target]
+        while path[-1] != source:
+            path.append(int(prev[path[-1]]))
+        path.reverse()
+        return path
+
+    def shortest_path(self, source_node, target_node):
+        """
+        Drop-in for nx.shortest_path on the vertex-level graph: takes and
+        returns coordinate nodes, with the path as a list of [lon, lat] lists.
+        """
+        path = self.astar(self._ids[source_node], self._ids[target_node])
+        return self.coords[path].tolist()
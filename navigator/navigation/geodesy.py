@@ -0,0 +1,30 @@
+"""
+Great-circle helpers shared by the routing code. All functions take
+longitude/latitude in degrees and accept NumPy arrays for vectorized use.
+"""
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8  # Mean Earth radius (IUGG), in metres
+
+
+def haversine(lon1, lat1, lon2, lat2):
+    """Great-circle distance in metres between (lon1, lat1) and (lon2, lat2)."""
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def segment_lengths(coords):
+    """
+    Lengths in metres of every segment of a LineString, given its coordinates
+    as an (N, 2) or (N, 3) array-like of lon/lat[/z]. Computed in one pass.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    if len(coords) < 2:
+        return np.zeros(0)
+    return haversine(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+
+
+def path_length(coords):
+    """Total length in metres of a LineString's coordinate list."""
+    return float(segment_lengths(coords).sum())
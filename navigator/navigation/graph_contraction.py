@@ -0,0 +1,192 @@
+"""
+Topology-compressed view of the routing graph.
+
+The vertex-level graph built from CachedRoad turns every polyline vertex into
+a node. ContractedGraph collapses each chain of degree-2 vertices into one
+edge that carries the chain's summed weight and full geometry, so path
+searches only visit junctions and dead ends. Geometry is expanded back to
+vertex resolution only when a route is emitted.
+"""
+from contextlib import contextmanager
+
+import networkx as nx
+
+
+class ContractedGraph:
+    """
+    Junction-only graph derived from a vertex-level graph.
+
+    Each edge carries ``weight`` (sum of the chain's segment weights) and
+    ``geometry`` (the chain's vertices, ordered from ``geometry[0]``). Interior
+    chain vertices are not nodes; use ``endpoints()`` to route from or to one.
+    """
+
+    def __init__(self, base_graph):
+        self.base = base_graph
+        self.graph = nx.Graph()
+        self._chain_of = {}  # interior vertex -> (u, v) of the edge holding it
+        self._contract()
+
+    def _contract(self):
+        base = self.base
+        self.graph.add_nodes_from(node for node in base if base.degree(node) != 2)
+        self._cover(list(self.graph), list(base.edges()))
+
+    def _cover(self, starts, edges):
+        """
+        Adds chains over the base ``edges`` (none of which is in a chain yet),
+        walking from the nodes in ``starts`` first. Chains end at any node of
+        the contracted graph.
+        """
+        base = self.base
+        free = {frozenset(edge) for edge in edges}
+
+        def walk(start, first):
+            chain = [start, first]
+            free.discard(frozenset((start, first)))
+            while chain[-1] not in self.graph:
+                prev, current = chain[-2], chain[-1]
+                nxt = next(n for n in base[current] if n != prev)
+                free.discard(frozenset((current, nxt)))
+                chain.append(nxt)
+            self._add_chain(chain)
+
+        for start in starts:
+            for first in base[start]:
+                if frozenset((start, first)) in free:
+                    walk(start, first)
+
+        # What is left are isolated rings with no junction; anchor each at one vertex.
+        for u, v in edges:
+            if frozenset((u, v)) in free:
+                self.graph.add_node(u)
+                walk(u, v)
+
+    def update(self, touched):
+        """
+        Re-contracts around the base nodes in ``touched`` (the ends of every
+        base edge added or removed since the last update) after the base graph
+        changed, in time proportional to the chains through them.
+        """
+        base = self.base
+        affected = set()
+        for node in touched:
+            if node in self.graph:
+                affected.update((node, other) for other in self.graph[node])
+            elif node in self._chain_of:
+                affected.add(self._chain_of[node])
+
+        region, freed = set(touched), []
+        for u, v in affected:
+            if not self.graph.has_edge(u, v):
+                continue  # Listed from both ends
+            geometry = self.graph.edges[u, v]["geometry"]
+            self.graph.remove_edge(u, v)
+            for node in geometry[1:-1]:
+                self._chain_of.pop(node, None)
+            region.update(geometry)
+            freed.extend(zip(geometry, geometry[1:]))
+
+        for node in region:
+            if node not in base:
+                self._chain_of.pop(node, None)
+                if node in self.graph:
+                    self.graph.remove_node(node)
+            elif base.degree(node) != 2:
+                self.graph.add_node(node)
+            elif node in self.graph and not self.graph.degree(node):
+                self.graph.remove_node(node)  # Now an interior vertex of a chain
+
+        edges = [edge for edge in freed if base.has_edge(*edge)]
+        edges.extend((node, other) for node in touched if node in base for other in base[node])
+        self._cover([node for node in region if node in self.graph], edges)
+
+    def _add_chain(self, chain):
+        u, v = chain[0], chain[-1]
+        if u == v:
+            self._split_chain(chain)
+        elif self.graph.has_edge(u, v):
+            # Parallel chains cannot share an edge in nx.Graph. A direct base
+            # edge cannot be split, so the longer chain already there is.
+            if len(chain) == 2:
+                existing = self.graph.edges[u, v]["geometry"]
+                self.graph.remove_edge(u, v)
+                self._set_chain(chain)
+                self._split_chain(existing)
+            else:
+                self._split_chain(chain)
+        else:
+            self._set_chain(chain)
+
+    def _split_chain(self, chain):
+        """Keeps the chain's middle vertex as a node and adds both halves."""
+        mid = len(chain) // 2
+        self.graph.add_node(chain[mid])
+        self._chain_of.pop(chain[mid], None)
+        self._add_chain(chain[:mid + 1])
+        self._add_chain(chain[mid:])
+
+    def _set_chain(self, chain):
+        u, v = chain[0], chain[-1]
+        weight = sum(self.base[a][b]["weight"] for a, b in zip(chain, chain[1:]))
+        self.graph.add_edge(u, v, weight=weight, geometry=chain)
+        for node in chain[1:-1]:
+            self._chain_of[node] = (u, v)
+
+    def number_of_nodes(self):
+        return self.graph.number_of_nodes()
+
+    def number_of_edges(self):
+        return self.graph.number_of_edges()
+
+    @contextmanager
+    def endpoints(self, *nodes):
+        """
+        Temporarily splits the edges holding any interior-vertex ``nodes`` so
+        they can be used as search endpoints, restoring the graph on exit.
+        Yields the nodes unchanged. Callers must hold the graph store lock.
+        """
+        inserted = [node for node in dict.fromkeys(nodes) if node not in self.graph]
+        removed, added = [], []
+        try:
+            for node in inserted:
+                self._split_at(node, removed, added)
+            yield nodes
+        finally:
+            self.graph.remove_nodes_from(inserted)
+            for u, v, data in removed:
+                self.graph.add_edge(u, v, **data)
+
+    def _split_at(self, node, removed, added):
+        u, v = self._chain_of[node]
+        # The chain may already be split by an earlier endpoint on it.
+        candidates = [(u, v)] if self.graph.has_edge(u, v) else [e for e in added if node in self.graph.edges[e]["geometry"]]
+        for a, b in candidates:
+            data = self.graph.edges[a, b]
+            geometry = data["geometry"]
+            if node not in geometry:
+                continue
+            i = geometry.index(node)
+            left, right = geometry[:i + 1], geometry[i:]
+            self.graph.remove_edge(a, b)
+            if (a, b) in added:
+                added.remove((a, b))
+            else:
+                removed.append((a, b, data))
+            for part in (left, right):
+                weight = sum(self.base[p][q]["weight"] for p, q in zip(part, part[1:]))
+                self.graph.add_edge(part[0], part[-1], weight=weight, geometry=part)
+                added.append((part[0], part[-1]))
+            return
+
+    def expand(self, path):
+        """Turns a junction-level node path into the full list of vertex coordinates."""
+        if len(path) == 1:
+            return [list(path[0])]
+        coords = [list(path[0])]
+        for a, b in zip(path, path[1:]):
+            geometry = self.graph.edges[a, b]["geometry"]
+            if geometry[0] != a:
+                geometry = geometry[::-1]
+            coords.extend(list(coord) for coord in geometry[1:])
+        return coords
@@ -0,0 +1,376 @@
+"""
+Process-wide routing graph built from CachedRoad.
+
+The graph is built once per worker and then kept in step with CachedRoad:
+writes made in this process are applied incrementally (see signals.py), while
+writes made by other workers are picked up through CachedDataset's version
+counter, which triggers a full rebuild on the next read.
+
+Roads from OSM only connect where they share a vertex (a road crossing
+another without one is a bridge or tunnel). User-drawn paths (negative
+osm_id, see CachedRoad.next_user_path_id) are instead spliced in: split at
+every crossing with an existing edge, the crossed edges split at the same
+points. Removing a path merges the edges it split back together. A full
+rebuild replays the splices in the order the paths were added, giving the
+same junctions and routes as the incremental updates, but not always
+bit-identical nodes: a crossing point is computed in floating point against
+the edge as it is split at that time, so after other paths were added or
+removed the same crossing can differ in the last bits.
+
+The spatial indexes, the contracted graph and the CSR graph are updated in
+place around the changed edges rather than re-derived.
+"""
+import logging
+import threading
+from collections import defaultdict
+
+import networkx as nx
+import numpy as np
+
+from .csr_graph import CSRGraph
+from .geodesy import haversine, segment_lengths
+from .graph_contraction import ContractedGraph
+from .models import CachedDataset, CachedRoad
+from .spatial_index import REBUILD_PENDING, EdgeIndex, NodeIndex
+
+logger = logging.getLogger(__name__)
+
+# Unit of the graph's edge "weight" attribute and of route distances
+WEIGHT_UNIT = "m"
+
+
+def _road_segments(coordinates):
+    """
+    Yields (start_node, end_node, distance) for every consecutive pair of
+    vertices in a LineString coordinate list, with distance in metres.
+    """
+    coords = np.asarray(coordinates, dtype=np.float64)
+    distances = segment_lengths(coords)
+    # Use tuple(point) for NetworkX nodes to ensure hashability
+    nodes = [tuple(coord) for coord in coords.tolist()]
+    for start_node, end_node, distance in zip(nodes, nodes[1:], distances.tolist()):
+        if start_node == end_node:
+            continue  # Repeated vertex; a self-loop adds nothing to routing
+        yield start_node, end_node, distance
+
+
+class RoutingGraphStore:
+    """
+    Holds the routing graph built from CachedRoad.
+
+    Edges remember which roads contributed them, so removing a road only
+    drops the edges no other road shares. Callers running a path search on
+    the graph should hold ``lock`` for the duration of the search.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._graph = None
+        self._index = None
+        self._edge_index = None
+        self._contracted = None
+        self._csr = None
+        self._version = None
+        self._road_edges = {}  # osm_id -> [(start_node, end_node), ...]
+        self._crossing_nodes = set()  # Nodes added where a user path crossed an edge
+        self._new_nodes = []  # Nodes and edges added since the indexes were last extended
+        self._new_edges = []
+        self._removed_edges = []  # Edges removed since the derived graphs were last updated
+
+    def get(self):
+        """
+        Returns the graph, rebuilding it first if CachedRoad changed since it
+        was built.
+        """
+        version = CachedDataset.current_version(CachedDataset.ROADS)
+        with self.lock:
+            if self._graph is None or self._version != version:
+                self._rebuild(version)
+            return self._graph
+
+    def node_index(self):
+        """
+        Returns the NodeIndex over the current graph's vertices, building it
+        lazily after the graph was (re)built or changed. Call after get().
+        """
+        with self.lock:
+            if self._index is None and self._graph is not None:
+                self._index = NodeIndex(self._graph.nodes())
+            return self._index
+
+    def contracted_graph(self):
+        """
+        Returns the junction-only ContractedGraph derived from the current
+        graph, building it lazily like node_index(). Call after get().
+        """
+        with self.lock:
+            if self._contracted is None and self._graph is not None:
+                self._contracted = ContractedGraph(self._graph)
+                logger.info(
+                    "Routing graph v%s contracted to %d nodes and %d edges.",
+                    self._version, self._contracted.number_of_nodes(), self._contracted.number_of_edges(),
+                )
+            return self._contracted
+
+    def csr_graph(self):
+        """
+        Returns the array-backed CSRGraph for the current graph, building it
+        lazily like node_index(). Call after get().
+        """
+        with self.lock:
+            if self._csr is None and self._graph is not None:
+                self._csr = CSRGraph.from_networkx(self._graph)
+            return self._csr
+
+    def invalidate(self):
+        """Drops the graph so the next get() rebuilds it from the database."""
+        with self.lock:
+            self._graph = None
+            self._version = None
+            self._reset_derived()
+
+    def _reset_derived(self):
+        """Drops the structures derived from the graph after it changed."""
+        self._index = None
+        self._edge_index = None
+        self._contracted = None
+        self._csr = None
+
+    def _update_derived(self, removed_nodes):
+        """
+        After an incremental change: extends the spatial indexes with the new
+        nodes and edges (the node index is rebuilt lazily instead when nodes
+        were removed) and updates the contracted and CSR graphs around the
+        added and removed edges.
+        """
+        if removed_nodes:
+            self._index = None
+        elif self._index is not None:
+            self._index.add(self._new_nodes)
+        if self._edge_index is not None:
+            self._edge_index.add(self._new_edges)
+        changed = self._new_edges + self._removed_edges
+        if self._contracted is not None:
+            self._contracted.update({node for edge in changed for node in edge})
+        if self._csr is not None:
+            self._csr.update(self._graph, changed)
+            if self._csr.overlay_size() > REBUILD_PENDING:
+                self._csr = None  # Rebuilt lazily with the overlay folded into the arrays
+        self._new_nodes, self._new_edges, self._removed_edges = [], [], []
+
+    def road_saved(self, road_obj, version):
+        """Applies an inserted or updated CachedRoad to the live graph."""
+        with self.lock:
+            if not self._in_step(version):
+                return
+            try:
+                removed_nodes = self._remove_road(road_obj.osm_id)
+                self._add_road(road_obj)
+            except Exception as e:
+                # A failed splice may have split edges already; rebuild rather than keep a half-edited graph
+                logger.warning("Splicing CachedRoad %s into the graph failed: %s. Dropping the graph.", road_obj.osm_id, e)
+                self.invalidate()
+                return
+            self._update_derived(removed_nodes)
+            self._version = version
+
+    def road_deleted(self, osm_id, version):
+        """Removes a deleted CachedRoad's edges from the live graph."""
+        with self.lock:
+            if not self._in_step(version):
+                return
+            self._update_derived(self._remove_road(osm_id))
+            self._version = version
+
+    def _in_step(self, version):
+        """
+        True when the graph reflects every write up to ``version - 1``, i.e. the
+        incoming change is the only one it has not seen yet. Otherwise another
+        worker wrote in between and the graph is dropped for a full rebuild.
+        """
+        if self._graph is None:
+            return False
+        if self._version != version - 1:
+            self.invalidate()
+            return False
+        return True
+
+    def _rebuild(self, version):
+        self._graph = nx.Graph()
+        self._reset_derived()
+        self._road_edges = {}
+        self._crossing_nodes = set()
+        for road_obj in CachedRoad.objects.filter(osm_id__gte=0):
+            self._add_road(road_obj)
+        self._new_nodes, self._new_edges = [], []
+        # User paths last, in the order they were added (ids count down from -1)
+        for road_obj in CachedRoad.objects.filter(osm_id__lt=0).order_by("-osm_id"):
+            try:
+                self._add_road(road_obj)
+            except Exception as e:
+                logger.warning("An error occurred splicing CachedRoad %s into the graph: %s. Skipping this path.", road_obj.osm_id, e)
+            self._edges_index().add(self._new_edges)
+            self._new_nodes, self._new_edges = [], []
+        self._removed_edges = []
+        self._version = version
+        logger.info(
+            "Routing graph v%s built with %d nodes and %d edges.",
+            version, self._graph.number_of_nodes(), self._graph.number_of_edges(),
+        )
+
+    def _add_road(self, road_obj):
+        try:
+            geometry = road_obj.geometry
+            if geometry is None or geometry.empty:
+                logger.warning("CachedRoad %s geometry is missing or empty. Skipping.", road_obj.osm_id)
+                return
+
+            if road_obj.osm_id < 0:
+                edges = self._splice_path(road_obj.osm_id, geometry.coords)
+            else:
+                edges = []
+                for start_node, end_node, distance in _road_segments(geometry.coords):
+                    self._connect(start_node, end_node, {road_obj.osm_id}, distance)
+                    edges.append((start_node, end_node))
+                if self._crossing_nodes:
+                    # A vertex of the road itself is no longer only a crossing
+                    self._crossing_nodes.difference_update(node for edge in edges for node in edge)
+        except Exception as e:
+            if road_obj.osm_id < 0:
+                raise  # The splice may have split edges already; the caller decides what to drop
+            logger.warning("An error occurred processing CachedRoad %s for graph: %s. Skipping this road.", road_obj.osm_id, e)
+            return
+
+        self._road_edges[road_obj.osm_id] = edges
+
+    def _connect(self, start_node, end_node, roads, distance=None):
+        """Adds the edge for ``roads`` (or adds them to the existing edge), noting new nodes and edges."""
+        if self._graph.has_edge(start_node, end_node):
+            self._graph[start_node][end_node]["roads"].update(roads)
+            return
+        for node in (start_node, end_node):
+            if node not in self._graph:
+                self._new_nodes.append(node)
+        if distance is None:
+            distance = float(haversine(start_node[0], start_node[1], end_node[0], end_node[1]))
+        self._graph.add_edge(start_node, end_node, weight=distance, roads=set(roads))
+        self._new_edges.append((start_node, end_node))
+
+    def _edges_index(self):
+        """The EdgeIndex over the current graph, built on first use."""
+        if self._edge_index is None:
+            self._edge_index = EdgeIndex(self._graph.edges)
+        return self._edge_index
+
+    def _splice_path(self, osm_id, coordinates):
+        """
+        Adds a user path, split at its crossings with existing edges, which
+        are split at the same points. Costs O(path length * log N) plus the
+        crossings found. Returns the path's edges.
+        """
+        coords = np.asarray(coordinates, dtype=np.float64)[:, :2]
+        if len(coords) < 2:
+            return []
+        path = [tuple(coord) for coord in coords.tolist()]
+        segments = np.stack([coords[:-1], coords[1:]], axis=1)
+
+        inserts = defaultdict(list)  # segment index -> [(t, point), ...]
+        splits = defaultdict(set)  # crossed edge -> {(s, point), ...}
+        crossing_nodes = set()
+        for i, t, s, point, edge in self._edges_index().crossings(segments, self._graph.has_edge):
+            inserts[i].append((t, point))
+            if point not in edge:
+                splits[edge].add((s, point))
+            if point not in self._graph:
+                crossing_nodes.add(point)
+        self._crossing_nodes.difference_update(path)
+        self._crossing_nodes.update(crossing_nodes.difference(path))
+        for (u, v), points in splits.items():
+            self._split_edge(u, v, [point for _, point in sorted(points)])
+
+        vertices = [path[0]]
+        for i in range(len(segments)):
+            vertices.extend(point for _, point in sorted(inserts[i]))
+            vertices.append(path[i + 1])
+        edges = []
+        for start_node, end_node in zip(vertices, vertices[1:]):
+            if start_node != end_node:
+                self._connect(start_node, end_node, {osm_id})
+                edges.append((start_node, end_node))
+        return edges
+
+    def _split_edge(self, u, v, points):
+        """Replaces edge (u, v) with the chain u -> points -> v, for the same roads."""
+        roads = set(self._graph[u][v]["roads"])
+        self._graph.remove_edge(u, v)
+        self._removed_edges.append((u, v))
+        chain = [u, *points, v]
+        # Crossings computed at the same point give one vertex
+        chain = [node for k, node in enumerate(chain) if k == 0 or node != chain[k - 1]]
+        pieces = list(zip(chain, chain[1:]))
+        for start_node, end_node in pieces:
+            self._connect(start_node, end_node, roads)
+        reversed_pieces = [(end_node, start_node) for start_node, end_node in reversed(pieces)]
+        for osm_id in roads:
+            edges = self._road_edges.get(osm_id, [])
+            for j in range(len(edges) - 1, -1, -1):
+                if edges[j] == (u, v):
+                    edges[j:j + 1] = pieces
+                elif edges[j] == (v, u):
+                    edges[j:j + 1] = reversed_pieces
+
+    def _remove_road(self, osm_id):
+        """
+        Drops the road's edges that no other road shares, then merges edges
+        split at crossings the road no longer makes. Returns True when nodes
+        were removed.
+        """
+        removed_nodes = False
+        touched = set()
+        for start_node, end_node in self._road_edges.pop(osm_id, []):
+            if not self._graph.has_edge(start_node, end_node):
+                continue
+            roads = self._graph[start_node][end_node]["roads"]
+            roads.discard(osm_id)
+            if not roads:
+                self._graph.remove_edge(start_node, end_node)
+                self._removed_edges.append((start_node, end_node))
+                for node in (start_node, end_node):
+                    if node in self._graph and self._graph.degree(node) == 0:
+                        self._graph.remove_node(node)
+                        self._crossing_nodes.discard(node)
+                        removed_nodes = True
+            touched.update((start_node, end_node))
+        return self._merge_crossings(touched) or removed_nodes
+
+    def _merge_crossings(self, nodes):
+        """
+        Undoes _split_edge at the crossing nodes among ``nodes`` that now only
+        join two pieces of the same roads. Returns True when nodes were removed.
+        """
+        removed_nodes = False
+        for node in nodes & self._crossing_nodes:
+            if node not in self._graph or self._graph.degree(node) != 2:
+                continue
+            u, v = self._graph.neighbors(node)
+            roads = self._graph[u][node]["roads"]
+            if roads != self._graph[node][v]["roads"] or self._graph.has_edge(u, v):
+                continue
+            roads = set(roads)
+            self._graph.remove_node(node)
+            self._removed_edges.extend([(u, node), (node, v)])
+            self._crossing_nodes.discard(node)
+            removed_nodes = True
+            self._connect(u, v, roads)
+            for osm_id in roads:
+                edges = self._road_edges.get(osm_id, [])
+                for j in range(len(edges) - 2, -1, -1):
+                    if edges[j:j + 2] == [(u, node), (node, v)]:
+                        edges[j:j + 2] = [(u, v)]
+                    elif edges[j:j + 2] == [(v, node), (node, u)]:
+                        edges[j:j + 2] = [(v, u)]
+        return removed_nodes
+
+
+# One store per worker process.
+graph_store = RoutingGraphStore()
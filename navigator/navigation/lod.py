@@ -0,0 +1,45 @@
+"""
+Precomputed levels of detail for the cached datasets.
+
+CachedRoad and DITCachedBuildings keep, next to the full geometry, copies
+simplified (topology-preserving) for the lower zoom bands. They are computed
+once when a row is written (``simplified_geometries``, applied by the
+models' save() and by cache_fill's bulk upserts) instead of simplifying on
+every request; readers pick the column for their zoom with ``lod_column``.
+"""
+from django.db.models.functions import Coalesce
+
+from .viewport import pixel_tolerance
+
+# (highest zoom of the band, column). Each copy is simplified to half a pixel
+# at its band's highest zoom; above the last band the full geometry is used.
+LOD_BANDS = (
+    (12, "geometry_z12"),
+    (15, "geometry_z15"),
+)
+LOD_COLUMNS = [column for _, column in LOD_BANDS]
+
+
+def lod_column(zoom):
+    """The geometry column to serve at ``zoom`` ("geometry" when None or past the last band)."""
+    if zoom is not None:
+        for max_zoom, column in LOD_BANDS:
+            if zoom <= max_zoom:
+                return column
+    return "geometry"
+
+
+def lod_expression(zoom):
+    """ORM expression for ``lod_column(zoom)``, falling back to the full geometry where a copy is missing."""
+    column = lod_column(zoom)
+    return column if column == "geometry" else Coalesce(column, "geometry")
+
+
+def simplified_geometries(geometry):
+    """{column: simplified copy} of a GEOS geometry for every band."""
+    if geometry is None:
+        return dict.fromkeys(LOD_COLUMNS)
+    return {
+        column: geometry.simplify(pixel_tolerance(max_zoom), preserve_topology=True)
+        for max_zoom, column in LOD_BANDS
+    }
@@ -0,0 +1,83 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from navigation.osm_queries import bbox_filter_sql, output_geometry_sql
+from navigation.viewport import CASE_STUDY_BBOX, Viewport, envelope_sql
+
+TABLE = "bench_planet_osm_polygon"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the bbox filter that transforms every row (ST_Transform(way, 4326)) with the "
+        "index-friendly one (envelope transformed to EPSG:3857, && prefilter) on a synthetic "
+        "osm2pgsql-style polygon table"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=200000, help="Synthetic buildings to generate")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs per query")
+
+    def handle(self, *args, **options):
+        viewport = Viewport(*CASE_STUDY_BBOX)
+        params = viewport.sql_params()
+
+        old_sql = f"""
+            SELECT osm_id, ST_AsGeoJSON(ST_Transform(way, 4326))
+            FROM {TABLE}
+            WHERE building IS NOT NULL
+            AND ST_Intersects(ST_Transform(way, 4326), {envelope_sql})
+        """
+        new_sql = f"""
+            SELECT osm_id, ST_AsGeoJSON({output_geometry_sql(viewport, srid=3857)})
+            FROM {TABLE}
+            WHERE building IS NOT NULL
+            AND {bbox_filter_sql(srid=3857)}
+        """
+
+        with connection.cursor() as cursor:
+            self._create_table(cursor, options["rows"])
+            results = {}
+            for label, sql in (("transform every row", old_sql), ("native-SRID envelope", new_sql)):
+                cursor.execute("EXPLAIN " + sql, params)
+                plan = [row[0] for row in cursor.fetchall()]
+                timings = []
+                for _ in range(options["repeat"]):
+                    start = time.perf_counter()
+                    cursor.execute(sql, params)
+                    count = len(cursor.fetchall())
+                    timings.append(time.perf_counter() - start)
+                results[label] = statistics.median(timings)
+                scan = next((line.strip() for line in plan if "Scan" in line), plan[0].strip())
+                self.stdout.write(
+                    f"{label}: {count} rows, median {results[label] * 1000:.1f} ms over {len(timings)} runs\n"
+                    f"    {scan}"
+                )
+
+        old, new = results.values()
+        self.stdout.write(self.style.SUCCESS(f"Speed-up: {old / new:.1f}x" if new else "Speed-up: n/a"))
+
+    def _create_table(self, cursor, rows):
+        """Temporary planet_osm_polygon look-alike: random ~20 m squares in EPSG:3857 around the case-study area."""
+        self.stdout.write(f"Generating {rows} synthetic buildings...")
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        cursor.execute(f"""
+            CREATE TEMPORARY TABLE {TABLE} (
+                osm_id bigint,
+                building text,
+                way geometry(Polygon, 3857)
+            )
+        """)
+        # Spread the rows over ~1 degree around the case-study area so the bbox selects a small fraction
+        cursor.execute(f"""
+            INSERT INTO {TABLE} (osm_id, building, way)
+            SELECT g, 'yes', ST_Expand(ST_Transform(ST_SetSRID(ST_MakePoint(
+                       38.78 + random(), -7.31 + random()), 4326), 3857), 10)
+            FROM generate_series(1, %s) AS g
+        """, [rows])
+        # osm2pgsql creates a GiST index on way
+        cursor.execute(f"CREATE INDEX ON {TABLE} USING GIST (way)")
+        cursor.execute(f"ANALYZE {TABLE}")
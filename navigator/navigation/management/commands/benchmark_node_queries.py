@@ -0,0 +1,86 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from navigation.osm_queries import NODE_FILTER_SQL, NODE_RANGE_SQL, node_index_sql
+from navigation.viewport import CASE_STUDY_BBOX, Viewport, envelope_sql
+
+TABLE = "bench_planet_osm_nodes"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the node bbox filter that builds a point per row (ST_MakePoint(lon / 1e7, lat / 1e7)) "
+        "with integer range predicates on lat/lon over the tagged nodes, backed by the index_nodes "
+        "index, on a synthetic osm2pgsql-style node table"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=2000000, help="Synthetic nodes to generate")
+        parser.add_argument("--tagged", type=float, default=0.05, help="Fraction of nodes that carry tags")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs per query")
+        parser.add_argument("--brin", action="store_true", help="Index with BRIN instead of the btree")
+
+    def handle(self, *args, **options):
+        viewport = Viewport(*CASE_STUDY_BBOX)
+        params = viewport.sql_params()
+
+        old_sql = f"""
+            SELECT id, lat / 1e7, lon / 1e7, tags
+            FROM {TABLE}
+            WHERE ST_Intersects(ST_SetSRID(ST_MakePoint(lon / 1e7, lat / 1e7), 4326), {envelope_sql})
+        """
+        new_sql = f"""
+            SELECT id, lat / 1e7, lon / 1e7, tags
+            FROM {TABLE}
+            WHERE {NODE_FILTER_SQL}
+            AND {NODE_RANGE_SQL}
+        """
+
+        with connection.cursor() as cursor:
+            self._create_table(cursor, options["rows"], options["tagged"], options["brin"])
+            results = {}
+            for label, sql in (("point per row", old_sql), ("integer ranges, tagged only", new_sql)):
+                cursor.execute("EXPLAIN " + sql, params)
+                plan = [row[0] for row in cursor.fetchall()]
+                timings = []
+                for _ in range(options["repeat"]):
+                    start = time.perf_counter()
+                    cursor.execute(sql, params)
+                    count = len(cursor.fetchall())
+                    timings.append(time.perf_counter() - start)
+                results[label] = statistics.median(timings)
+                scan = next((line.strip() for line in plan if "Scan" in line), plan[0].strip())
+                self.stdout.write(
+                    f"{label}: {count} rows, median {results[label] * 1000:.1f} ms over {len(timings)} runs\n"
+                    f"    {scan}"
+                )
+
+        old, new = results.values()
+        self.stdout.write(self.style.SUCCESS(f"Speed-up: {old / new:.1f}x" if new else "Speed-up: n/a"))
+
+    def _create_table(self, cursor, rows, tagged, brin):
+        """Temporary planet_osm_nodes look-alike: fixed-point lat/lon around the case-study area, a fraction tagged."""
+        self.stdout.write(f"Generating {rows} synthetic nodes ({tagged:.0%} tagged)...")
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        cursor.execute(f"""
+            CREATE TEMPORARY TABLE {TABLE} (
+                id bigint PRIMARY KEY,
+                lat integer NOT NULL,
+                lon integer NOT NULL,
+                tags jsonb
+            )
+        """)
+        # Spread the nodes over ~1 degree around the case-study area so the bbox selects a small fraction
+        cursor.execute(f"""
+            INSERT INTO {TABLE} (id, lat, lon, tags)
+            SELECT g,
+                   ((-7.31 + random()) * 1e7)::integer,
+                   ((38.78 + random()) * 1e7)::integer,
+                   CASE WHEN random() < %s THEN jsonb_build_object('amenity', 'bench') END
+            FROM generate_series(1, %s) AS g
+        """, [tagged, rows])
+        cursor.execute(node_index_sql(table=TABLE, brin=brin))
+        cursor.execute(f"ANALYZE {TABLE}")
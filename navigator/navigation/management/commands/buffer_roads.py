@@ -1,22 +1,83 @@
-from django.core.management.base import BaseCommand
-from navigation.models import Road, BufferedRoad
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from navigation.models import BufferedRoad, Road
+from navigation.walkable_area import build_walkable_area
+
+# Buffer distance in metres either side of the centerline
+DEFAULT_WIDTH = 5.0
+
+# md5 over what a road's polygon depends on; a changed hash means its BufferedRoad is stale
+_ROAD_HASH_SQL = "md5(concat_ws('|', encode(ST_AsBinary(r.geom), 'hex'), r.name, %(width)s::text))"
+
 
 class Command(BaseCommand):
-    help = "Buffer road centerlines to create road polygons"
+    help = (
+        "Buffer road centerlines (Road) into road polygons (BufferedRoad) with one set-based "
+        "INSERT ... SELECT ST_Buffer statement, then dissolve them into the walkable-area levels "
+        "(WalkableArea). Rebuilds every polygon unless --incremental."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--width", type=float, default=DEFAULT_WIDTH,
+            help="Buffer distance in metres either side of the centerline",
+        )
+        parser.add_argument(
+            "--incremental", action="store_true",
+            help="Only rebuild the polygons of new or changed roads (those of deleted roads go with them)",
+        )
+
+    def handle(self, *args, **options):
+        if options["width"] <= 0:
+            raise CommandError("--width must be positive.")
+        params = {"width": options["width"]}
+        buffered = BufferedRoad._meta.db_table
+        roads = Road._meta.db_table
 
-    def handle(self, *args, **kwargs):
-        buffer_size = 0.005  # Increase buffer size for better visibility
+        start = time.perf_counter()
+        with transaction.atomic(), connection.cursor() as cursor:
+            if options["incremental"]:
+                # Polygons written before they were linked to their road cannot be matched; rebuild them
+                cursor.execute(f"DELETE FROM {buffered} WHERE road_id IS NULL")
+                only_changed = f"""
+                    AND NOT EXISTS (
+                        SELECT 1 FROM {buffered} b WHERE b.road_id = r.id AND b.source_hash = {_ROAD_HASH_SQL}
+                    )
+                """
+            else:
+                cursor.execute(f"DELETE FROM {buffered}")
+                only_changed = ""
+            deleted = cursor.rowcount
 
-        # Clear existing buffered roads
-        BufferedRoad.objects.all().delete()
+            # Buffering the geography buffers in metres on the spheroid and returns lon/lat polygons
+            cursor.execute(f"""
+                INSERT INTO {buffered} (road_id, name, source_hash, geom)
+                SELECT r.id, r.name, {_ROAD_HASH_SQL},
+                       ST_Buffer(r.geom::geography, %(width)s, 'quad_segs=4')::geometry
+                FROM {roads} r
+                WHERE r.geom IS NOT NULL AND NOT ST_IsEmpty(r.geom)
+                {only_changed}
+                ON CONFLICT (road_id) DO UPDATE SET
+                    name = EXCLUDED.name,
+                    source_hash = EXCLUDED.source_hash,
+                    geom = EXCLUDED.geom
+            """, params)
+            written = cursor.rowcount
+            cursor.execute(f"ANALYZE {buffered}")
+        elapsed = time.perf_counter() - start
 
-        # Buffer each road and save as a polygon
-        for road in Road.objects.all():
-            if road.geom:
-                buffered_geom = road.geom.buffer(buffer_size)  # Create a buffer around the centerline
-                buffered_geom.srid = 3857  # Assume the data is in EPSG:3857 (Web Mercator)
-                buffered_geom_4326 = buffered_geom.transform(4326, clone=True)  # Transform to WGS84
-                BufferedRoad.objects.create(name=road.name, geom=buffered_geom_4326)
-                self.stdout.write(f"Buffered road: {road.name}, Geometry: {buffered_geom_4326.wkt}")
+        rate = written / elapsed if elapsed else 0.0
+        self.stdout.write(
+            f"Buffered {written} of {Road.objects.count()} roads ({options['width']:g} m) in {elapsed:.2f}s "
+            f"({rate:.0f} roads/s); {deleted} old polygons deleted."
+        )
 
-        self.stdout.write("Road buffering completed.")
+        start = time.perf_counter()
+        levels = build_walkable_area()
+        self.stdout.write(self.style.SUCCESS(
+            f"Dissolved {BufferedRoad.objects.count()} polygons into {levels} walkable-area levels "
+            f"in {time.perf_counter() - start:.2f}s."
+        ))
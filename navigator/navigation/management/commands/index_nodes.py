@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from navigation.osm_queries import node_index_sql
+
+
+class Command(BaseCommand):
+    help = (
+        "Index planet_osm_nodes for the map_nodes bbox queries: (lat, lon) of the tagged nodes only. "
+        "Built concurrently, so imports and reads are not blocked; run after each osm2pgsql import."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--brin", action="store_true",
+            help="Create a BRIN index instead of the btree (much smaller; only selective when the "
+                 "table is stored roughly in spatial order, e.g. after CLUSTER)",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        # CREATE INDEX CONCURRENTLY cannot run in a transaction; management commands run in autocommit
+        with connection.cursor() as cursor:
+            cursor.execute(node_index_sql(brin=options["brin"], concurrently=True))
+            cursor.execute("ANALYZE planet_osm_nodes")
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed tagged planet_osm_nodes ({'brin' if options['brin'] else 'btree'}) "
+            f"in {time.perf_counter() - start:.1f}s."
+        ))
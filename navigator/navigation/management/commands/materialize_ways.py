@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from navigation.models import OSMWayGeometry
+from navigation.osm_queries import materialize_way_geometries
+
+
+class Command(BaseCommand):
+    help = (
+        "Materialize highway LineStrings from planet_osm_ways / planet_osm_nodes into OSMWayGeometry "
+        "(GiST-indexed). Incremental by default; run after each osm2pgsql import or update."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full", action="store_true",
+            help="Rebuild every way, e.g. after node positions changed without their ways changing",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        written, deleted = materialize_way_geometries(full=options["full"])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Rebuilt' if options['full'] else 'Refreshed'} way geometries in {elapsed:.1f}s: "
+            f"{written} written, {deleted} deleted, {OSMWayGeometry.objects.count()} total."
+        ))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from navigation.cache_fill import FILLERS, warm
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the cached datasets (CachedRoad, DITCachedBuildings) from the OSM tables with bulk upserts. "
+        "Datasets another process is already filling are skipped unless --wait is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "datasets", nargs="*", metavar="dataset",
+            help=f"Datasets to fill ({', '.join(sorted(FILLERS))}); all by default",
+        )
+        parser.add_argument(
+            "--wait", action="store_true",
+            help="Wait for a fill running elsewhere to finish, then fill again",
+        )
+
+    def handle(self, *args, **options):
+        datasets = options["datasets"] or sorted(FILLERS)
+        unknown = set(datasets) - set(FILLERS)
+        if unknown:
+            raise CommandError(f"Unknown dataset(s): {', '.join(sorted(unknown))}")
+
+        total_rows, total_seconds = 0, 0.0
+        for dataset in datasets:
+            result = warm(dataset, wait=options["wait"], force=True)
+            if result is None:
+                self.stdout.write(self.style.WARNING(f"{dataset}: already being warmed by another process; skipped"))
+                continue
+            total_rows += result.rows
+            total_seconds += result.seconds
+            self.stdout.write(str(result))
+
+        rate = total_rows / total_seconds if total_seconds else 0.0
+        self.stdout.write(self.style.SUCCESS(f"Done: {total_rows} rows in {total_seconds:.2f}s ({rate:.0f} rows/s)"))
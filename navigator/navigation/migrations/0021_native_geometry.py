@@ -0,0 +1,54 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:00
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+# The JSON columns hold GeoJSON geometries (stored as JSON strings); convert
+# them in place so existing cached rows survive, then add GiST indexes.
+FORWARD_SQL = """
+    ALTER TABLE navigation_cachedroad
+        ALTER COLUMN geometry TYPE geometry(LineString, 4326)
+        USING ST_SetSRID(ST_GeomFromGeoJSON(geometry #>> '{}'), 4326);
+    CREATE INDEX navigation_cachedroad_geometry_id
+        ON navigation_cachedroad USING GIST (geometry);
+    ALTER TABLE navigation_ditcachedbuildings
+        ALTER COLUMN geometry TYPE geometry(Geometry, 4326)
+        USING ST_SetSRID(ST_GeomFromGeoJSON(geometry #>> '{}'), 4326);
+    CREATE INDEX navigation_ditcachedbuildings_geometry_id
+        ON navigation_ditcachedbuildings USING GIST (geometry);
+"""
+
+REVERSE_SQL = """
+    DROP INDEX IF EXISTS navigation_cachedroad_geometry_id;
+    ALTER TABLE navigation_cachedroad
+        ALTER COLUMN geometry TYPE jsonb USING to_jsonb(ST_AsGeoJSON(geometry));
+    DROP INDEX IF EXISTS navigation_ditcachedbuildings_geometry_id;
+    ALTER TABLE navigation_ditcachedbuildings
+        ALTER COLUMN geometry TYPE jsonb USING to_jsonb(ST_AsGeoJSON(geometry));
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("navigation", "0020_cacheddataset"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(FORWARD_SQL, REVERSE_SQL),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name="cachedroad",
+                    name="geometry",
+                    field=django.contrib.gis.db.models.fields.LineStringField(srid=4326),
+                ),
+                migrations.AlterField(
+                    model_name="ditcachedbuildings",
+                    name="geometry",
+                    field=django.contrib.gis.db.models.fields.GeometryField(srid=4326),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:00
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("navigation", "0021_native_geometry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OSMWayGeometry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("osm_id", models.BigIntegerField(unique=True)),
+                ("name", models.CharField(blank=True, max_length=255, null=True)),
+                ("highway", models.CharField(blank=True, max_length=64, null=True)),
+                ("source_hash", models.CharField(max_length=32)),
+                (
+                    "geometry",
+                    django.contrib.gis.db.models.fields.LineStringField(srid=4326),
+                ),
+            ],
+        ),
+    ]
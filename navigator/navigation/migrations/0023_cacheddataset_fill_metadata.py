@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-18 12:00
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("navigation", "0022_osmwaygeometry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cacheddataset",
+            name="filled_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="cacheddataset",
+            name="fill_bbox",
+            field=django.contrib.gis.db.models.fields.PolygonField(
+                blank=True, null=True, srid=4326
+            ),
+        ),
+        migrations.AddField(
+            model_name="cacheddataset",
+            name="source_rows",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
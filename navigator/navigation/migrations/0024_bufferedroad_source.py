@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("navigation", "0023_cacheddataset_fill_metadata"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bufferedroad",
+            name="road",
+            field=models.OneToOneField(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="buffered",
+                to="navigation.road",
+            ),
+        ),
+        migrations.AddField(
+            model_name="bufferedroad",
+            name="source_hash",
+            field=models.CharField(blank=True, default="", max_length=32),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:00
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("navigation", "0024_bufferedroad_source"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WalkableArea",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("min_zoom", models.PositiveSmallIntegerField(unique=True)),
+                ("tolerance", models.FloatField()),
+                ("source_rows", models.PositiveIntegerField()),
+                ("built_at", models.DateTimeField()),
+                (
+                    "geometry",
+                    django.contrib.gis.db.models.fields.MultiPolygonField(srid=4326),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:00
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+# Half a pixel in degrees at zoom 12 and 15 (viewport.pixel_tolerance)
+POPULATE_SQL = """
+    UPDATE {table} SET
+        geometry_z12 = ST_SimplifyPreserveTopology(geometry, 0.000171661376953125),
+        geometry_z15 = ST_SimplifyPreserveTopology(geometry, 2.1457672119140625e-05);
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("navigation", "0025_walkablearea"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cachedroad",
+            name="geometry_z12",
+            field=django.contrib.gis.db.models.fields.LineStringField(
+                blank=True, null=True, srid=4326
+            ),
+        ),
+        migrations.AddField(
+            model_name="cachedroad",
+            name="geometry_z15",
+            field=django.contrib.gis.db.models.fields.LineStringField(
+                blank=True, null=True, srid=4326
+            ),
+        ),
+        migrations.AddField(
+            model_name="ditcachedbuildings",
+            name="geometry_z12",
+            field=django.contrib.gis.db.models.fields.GeometryField(
+                blank=True, null=True, srid=4326
+            ),
+        ),
+        migrations.AddField(
+            model_name="ditcachedbuildings",
+            name="geometry_z15",
+            field=django.contrib.gis.db.models.fields.GeometryField(
+                blank=True, null=True, srid=4326
+            ),
+        ),
+        migrations.RunSQL(
+            POPULATE_SQL.format(table="navigation_cachedroad"),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            POPULATE_SQL.format(table="navigation_ditcachedbuildings"),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("navigation", "0026_cached_geometry_lods"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE SEQUENCE IF NOT EXISTS navigation_cachedroad_user_path_seq;",
+            reverse_sql="DROP SEQUENCE IF EXISTS navigation_cachedroad_user_path_seq;",
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:00
+
+from django.db import migrations
+from django.utils import timezone
+
+# CachedDataset name -> model holding its rows
+DATASETS = {
+    "roads": "CachedRoad",
+    "buildings": "DITCachedBuildings",
+}
+
+
+def backfill_fills(apps, schema_editor):
+    """Records a fill for datasets that already hold rows, so they keep being served."""
+    CachedDataset = apps.get_model("navigation", "CachedDataset")
+    for name, model_name in DATASETS.items():
+        rows = apps.get_model("navigation", model_name).objects.count()
+        if not rows:
+            continue
+        dataset, _ = CachedDataset.objects.get_or_create(name=name)
+        if dataset.filled_at is None:
+            dataset.filled_at = timezone.now()
+            dataset.source_rows = rows
+            dataset.save(update_fields=["filled_at", "source_rows"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("navigation", "0027_cachedroad_user_path_seq"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_fills, migrations.RunPython.noop),
+    ]
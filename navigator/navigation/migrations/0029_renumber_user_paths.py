@@ -0,0 +1,47 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:00
+
+from django.db import migrations
+from django.db.models import F
+
+USER_PATH_SEQUENCE = "navigation_cachedroad_user_path_seq"
+
+
+def renumber_user_paths(apps, schema_editor):
+    """
+    Gives user-drawn paths saved before 0027 (then numbered max(osm_id) + 1)
+    negative ids from the user path sequence, so the routing graph splices
+    them in and recent_added_roads lists them. They are told apart from
+    filled roads by not being an OSM way; without planet_osm_ways that cannot
+    be checked and the rows are left as they are.
+    """
+    connection = schema_editor.connection
+    if "planet_osm_ways" not in connection.introspection.table_names():
+        return
+    CachedRoad = apps.get_model("navigation", "CachedRoad")
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT r.id FROM {CachedRoad._meta.db_table} r
+            WHERE r.osm_id >= 0 AND NOT EXISTS (SELECT 1 FROM planet_osm_ways w WHERE w.id = r.osm_id)
+            ORDER BY r.osm_id
+        """)
+        ids = [row[0] for row in cursor.fetchall()]
+        # In creation order, so a graph rebuild replays them in the order they were drawn
+        for pk in ids:
+            cursor.execute(
+                f"UPDATE {CachedRoad._meta.db_table} SET osm_id = -nextval(%s) WHERE id = %s",
+                [USER_PATH_SEQUENCE, pk],
+            )
+    if ids:
+        # Workers holding a graph built with the old ids rebuild it
+        CachedDataset = apps.get_model("navigation", "CachedDataset")
+        CachedDataset.objects.filter(name="roads").update(version=F("version") + 1)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("navigation", "0028_backfill_cacheddataset_fill"),
+    ]
+
+    operations = [
+        migrations.RunPython(renumber_user_paths, migrations.RunPython.noop),
+    ]
@@ -11,6 +11,11 @@ class Location(models.Model):
 
 
 from django.contrib.gis.db import models
+from django.contrib.gis.geos import GEOSGeometry
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .lod import simplified_geometries
 
 class Road(models.Model):
     name = models.CharField(max_length=255, null=True)
@@ -23,6 +28,8 @@ class Road(models.Model):
 class BufferedRoad(models.Model):
     name = models.CharField(max_length=255, null=True)
     geom = models.PolygonField(srid=4326)  # Store road polygons
+    road = models.OneToOneField(Road, on_delete=models.CASCADE, null=True, blank=True, related_name="buffered")
+    source_hash = models.CharField(max_length=32, blank=True, default="")  # md5 of the road's geometry, name and buffer width
 
     def __str__(self):
         return self.name or "Unnamed Buffered Road"
@@ -46,14 +53,45 @@ class PlanetOSMPolygon(models.Model):
         return self.name or f"OSM Polygon {self.osm_id}"
 
 
-class CachedRoad(models.Model):
+class LODGeometryMixin:
+    """Keeps the simplified per-zoom copies of ``geometry`` (see lod.LOD_BANDS) in step on save()."""
+
+    def set_lods(self):
+        geometry = self.geometry
+        if isinstance(geometry, str):
+            geometry = GEOSGeometry(geometry, srid=4326)
+        for column, simplified in simplified_geometries(geometry).items():
+            setattr(self, column, simplified)
+
+    def save(self, *args, **kwargs):
+        self.set_lods()
+        super().save(*args, **kwargs)
+
+
+class CachedRoad(LODGeometryMixin, models.Model):
     osm_id = models.BigIntegerField(unique=True)  # Unique identifier for the road
     name = models.CharField(max_length=255, null=True, blank=True)
-    geometry = models.JSONField()  # Store the GeoJSON geometry as JSON
+    geometry = models.LineStringField(srid=4326)  # GiST-indexed; accepts GeoJSON strings on assignment
+    geometry_z12 = models.LineStringField(srid=4326, null=True, blank=True)  # Simplified for zoom <= 12
+    geometry_z15 = models.LineStringField(srid=4326, null=True, blank=True)  # Simplified for zoom 13-15
+
+    # Sequence user-drawn paths take their ids from (see migration 0027)
+    USER_PATH_SEQUENCE = "navigation_cachedroad_user_path_seq"
 
     def __str__(self):
         return self.name or f"Cached Road {self.osm_id}"
 
+    @classmethod
+    def next_user_path_id(cls):
+        """
+        Allocates an osm_id for a user-drawn path: negative, as in OSM editors
+        for new objects, so it never collides with ids filled from OSM, and
+        taken from a sequence, so concurrent requests never get the same one.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval(%s)", [cls.USER_PATH_SEQUENCE])
+            return -cursor.fetchone()[0]
+
 
 
 # Create your models here.
@@ -72,10 +110,108 @@ class CachedRoad(models.Model):
 #     }
 # ]
 
-class DITCachedBuildings(models.Model):
+class DITCachedBuildings(LODGeometryMixin, models.Model):
     osm_id = models.BigIntegerField(unique=True)  # Unique identifier for the block
     name = models.CharField(max_length=255, null=True, blank=True)
-    geometry = models.JSONField()  # Store the GeoJSON geometry as JSON
+    # Polygon or MultiPolygon (planet_osm_polygon holds both); GiST-indexed
+    geometry = models.GeometryField(srid=4326)
+    geometry_z12 = models.GeometryField(srid=4326, null=True, blank=True)  # Simplified for zoom <= 12
+    geometry_z15 = models.GeometryField(srid=4326, null=True, blank=True)  # Simplified for zoom 13-15
 
     def __str__(self):
         return self.name or f"Cached Block {self.osm_id}"
+
+
+class CachedDataset(models.Model):
+    """
+    Version counter for a cached dataset (e.g. CachedRoad, DITCachedBuildings).
+    Bumped on every write so long-lived, per-process structures built from the
+    dataset (routing graph, serialized payloads) can tell when they are stale.
+    Also records the last fill from the OSM tables, so whether the cache can be
+    used is decided from this one row rather than by counting the dataset.
+    """
+    ROADS = "roads"
+    BUILDINGS = "buildings"
+
+    name = models.CharField(max_length=64, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    filled_at = models.DateTimeField(null=True, blank=True)  # Last completed fill; null until filled
+    fill_bbox = models.PolygonField(srid=4326, null=True, blank=True)  # Area the last fill covered
+    source_rows = models.PositiveIntegerField(null=True, blank=True)  # Rows the last fill read from the source
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+    @classmethod
+    def current_version(cls, name):
+        """Returns the current version of the dataset, 0 if it was never written."""
+        return cls.objects.filter(name=name).values_list("version", flat=True).first() or 0
+
+    @classmethod
+    def is_filled(cls, name, bbox=None):
+        """
+        True once the dataset has been filled (covering ``bbox``, a 4326
+        polygon, when given), however few rows the fill found.
+        """
+        dataset = cls.objects.filter(name=name, filled_at__isnull=False).only("fill_bbox").first()
+        if dataset is None:
+            return False
+        return bbox is None or (dataset.fill_bbox is not None and dataset.fill_bbox.covers(bbox))
+
+    @classmethod
+    def record_fill(cls, name, bbox, source_rows):
+        """Records a completed fill and bumps the version; returns the new version."""
+        with transaction.atomic():
+            dataset, _ = cls.objects.select_for_update().get_or_create(name=name)
+            dataset.version += 1
+            dataset.filled_at = timezone.now()
+            dataset.fill_bbox = bbox
+            dataset.source_rows = source_rows
+            dataset.save()
+        return dataset.version
+
+    @classmethod
+    def clear_fill(cls, name):
+        """Forgets the last fill, so the next request warms the dataset again."""
+        cls.objects.filter(name=name).update(filled_at=None, fill_bbox=None, source_rows=None)
+
+    @classmethod
+    def bump(cls, name):
+        """Atomically increments the dataset version and returns the new value."""
+        with transaction.atomic():
+            dataset, _ = cls.objects.select_for_update().get_or_create(name=name)
+            dataset.version += 1
+            dataset.save(update_fields=["version", "updated_at"])
+        return dataset.version
+
+
+class OSMWayGeometry(models.Model):
+    """
+    Highway LineStrings built from planet_osm_ways / planet_osm_nodes by the
+    materialize_ways command, so readers do an indexed bbox lookup instead of
+    rebuilding each way from its node list.
+    """
+    osm_id = models.BigIntegerField(unique=True)  # planet_osm_ways.id
+    name = models.CharField(max_length=255, null=True, blank=True)
+    highway = models.CharField(max_length=64, null=True, blank=True)
+    source_hash = models.CharField(max_length=32)  # md5 of the way's nodes and tags, for incremental refreshes
+    geometry = models.LineStringField(srid=4326)  # GiST-indexed
+
+    def __str__(self):
+        return self.name or f"OSM Way {self.osm_id}"
+
+
+class WalkableArea(models.Model):
+    """
+    The BufferedRoad polygons dissolved into one MultiPolygon, stored once per
+    level of detail (see walkable_area.build_walkable_area).
+    """
+    min_zoom = models.PositiveSmallIntegerField(unique=True)  # Served from this zoom up to the next level's
+    tolerance = models.FloatField()  # Simplification tolerance, in degrees
+    source_rows = models.PositiveIntegerField()  # BufferedRoad rows dissolved
+    built_at = models.DateTimeField()
+    geometry = models.MultiPolygonField(srid=4326)
+
+    def __str__(self):
+        return f"Walkable area (zoom {self.min_zoom}+)"
@@ -0,0 +1,306 @@
+"""
+Bounding-box queries against the osm2pgsql planet_osm_* tables.
+
+Filtering with ``ST_Intersects(ST_Transform(way, 4326), envelope)`` reprojects
+every row before comparing it, so the GiST index on ``way`` cannot be used.
+The queries here transform the (constant) envelope into the table's native
+SRID once instead, prefilter with ``&&`` so the index does the bbox work, and
+only reproject the rows that match for output.
+
+Rows are read through ``iter_rows``: a named (server-side) cursor fetched in
+``fetchmany`` batches, with the bbox bound as query parameters, yielding rows
+lazily so callers serialize them as they arrive instead of after fetchall().
+
+PostgreSQL can also produce the final JSON (``rows_json_sql`` /
+``feature_collection_sql``, built with json_agg and ST_AsGeoJSON), which the
+views pass through as-is instead of decoding and re-encoding it in Python.
+Coordinates are written with settings.GEOJSON_PRECISION decimals.
+
+planet_osm_nodes keeps lat/lon as integers (degrees * 1e7). Nodes are
+selected with integer range predicates on those columns (``NODE_RANGE_SQL``),
+which a (lat, lon) index on the tagged nodes (see the index_nodes command)
+answers without building a point per row, and only tagged nodes (POIs,
+entrances, ...) are returned; untagged ones only carry way geometry.
+
+Highway ways are materialized as LineStrings into OSMWayGeometry (see the
+materialize_ways command) instead of being rebuilt from their node lists on
+every read.
+"""
+from django.conf import settings
+from django.contrib.gis.db.models.functions import AsGeoJSON
+from django.db import connection, transaction
+
+from .models import OSMWayGeometry
+from .viewport import envelope_sql
+
+# Rows fetched per round trip by iter_rows
+FETCH_BATCH_SIZE = 2000
+
+# Rows of planet_osm_polygon / planet_osm_line the map views read
+BUILDING_COLUMNS = "osm_id, name, landuse, building"
+ROAD_COLUMNS = "osm_id, name, highway"
+
+# Tagged planet_osm_nodes rows, and the viewport as integer ranges on their
+# fixed-point lat/lon; the bounds are constants, so the (lat, lon) index is used
+NODE_FILTER_SQL = "tags IS NOT NULL"
+NODE_RANGE_SQL = (
+    "lat BETWEEN floor(%(min_lat)s * 1e7)::integer AND ceil(%(max_lat)s * 1e7)::integer "
+    "AND lon BETWEEN floor(%(min_lng)s * 1e7)::integer AND ceil(%(max_lng)s * 1e7)::integer"
+)
+
+# layer -> how to read it as features. ``geom`` is the SQL geometry of a row
+# in ``srid`` (None: settings.OSM_SRID); ``filter`` replaces the default
+# bbox predicate on ``geom``; ``limit`` caps the rows returned.
+OSM_LAYERS = {
+    "buildings": {
+        "table": "planet_osm_polygon",
+        "columns": BUILDING_COLUMNS,
+        "where": "building IS NOT NULL",
+        "geom": "way",
+        "srid": None,
+        "filter": None,
+        "limit": 1000,
+    },
+    "roads": {
+        "table": "planet_osm_line",
+        "columns": ROAD_COLUMNS,
+        "where": "highway IS NOT NULL",
+        "geom": "way",
+        "srid": None,
+        "filter": None,
+        "limit": 1000,
+    },
+    "nodes": {
+        "table": "planet_osm_nodes",
+        "columns": "id, tags",
+        "where": NODE_FILTER_SQL,
+        "geom": "ST_SetSRID(ST_MakePoint(lon / 1e7, lat / 1e7), 4326)",
+        "srid": 4326,
+        "filter": NODE_RANGE_SQL,
+        "limit": 2000,
+    },
+}
+
+
+def iter_rows(sql, params=None, batch_size=FETCH_BATCH_SIZE):
+    """
+    Yields the rows of ``sql`` one at a time, fetched ``batch_size`` at a time
+    from a server-side cursor, so at most one batch is held in memory.
+    """
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+
+
+def native_envelope_sql(srid=None):
+    """The viewport envelope (see viewport.envelope_sql) in the OSM tables' SRID."""
+    srid = srid or settings.OSM_SRID
+    if srid == 4326:
+        return envelope_sql
+    return f"ST_Transform({envelope_sql}, {int(srid)})"
+
+
+def bbox_filter_sql(column="way", srid=None):
+    """Index-friendly predicate for rows of ``column`` intersecting the viewport."""
+    envelope = native_envelope_sql(srid)
+    return f"{column} && {envelope} AND ST_Intersects({column}, {envelope})"
+
+
+def output_geometry_sql(viewport, column="way", srid=None):
+    """``column`` reprojected to 4326 (and simplified for the viewport's zoom) for GeoJSON output."""
+    srid = srid or settings.OSM_SRID
+    geometry = column if srid == 4326 else f"ST_Transform({column}, 4326)"
+    return viewport.geometry_sql(geometry)
+
+
+def geojson_sql(expression):
+    """ST_AsGeoJSON of a geometry SQL expression, cut to settings.GEOJSON_PRECISION decimals."""
+    return f"ST_AsGeoJSON({expression}, {int(settings.GEOJSON_PRECISION)})"
+
+
+def _layer_rows_sql(layer, viewport, limit):
+    """Rows of ``layer`` in ``viewport``: its columns plus the output geometry as ``geom``."""
+    spec = OSM_LAYERS[layer]
+    return f"""
+        SELECT {spec["columns"]}, {output_geometry_sql(viewport, spec["geom"], spec["srid"])} AS geom
+        FROM {spec["table"]}
+        WHERE {spec["where"]}
+        AND {spec["filter"] or bbox_filter_sql(spec["geom"], spec["srid"])}
+        LIMIT {int(limit)}
+    """
+
+
+def rows_json_sql(layer, viewport, limit):
+    """
+    ``layer`` as the [{<columns>, geometry}] list the templates expect,
+    encoded by PostgreSQL as one JSON text value.
+    """
+    columns = [column.strip() for column in OSM_LAYERS[layer]["columns"].split(",")]
+    fields = ", ".join(f"'{column}', t.{column}" for column in columns)
+    return f"""
+        SELECT coalesce(
+            json_agg(json_build_object({fields}, 'geometry', {geojson_sql("t.geom")}::json)),
+            '[]'
+        )::text
+        FROM ({_layer_rows_sql(layer, viewport, limit)}) AS t;
+    """
+
+
+def feature_collection_sql(layer, viewport, limit):
+    """``layer`` as a GeoJSON FeatureCollection encoded by PostGIS (ST_AsGeoJSON(record))."""
+    return f"""
+        SELECT json_build_object(
+            'type', 'FeatureCollection',
+            'features', coalesce(json_agg(ST_AsGeoJSON(t.*, 'geom', {int(settings.GEOJSON_PRECISION)})::json), '[]')
+        )::text
+        FROM ({_layer_rows_sql(layer, viewport, limit)}) AS t;
+    """
+
+
+def fetch_json(sql, viewport):
+    """Runs a single-value JSON query (rows_json_sql / feature_collection_sql) and returns the text."""
+    with connection.cursor() as cursor:
+        cursor.execute(sql, viewport.sql_params())
+        return cursor.fetchone()[0]
+
+
+def buildings_sql(viewport, limit):
+    """Buildings in ``viewport``: (osm_id, name, landuse, building, GeoJSON)."""
+    return f"""
+        SELECT {BUILDING_COLUMNS}, {geojson_sql("t.geom")} AS geometry
+        FROM ({_layer_rows_sql("buildings", viewport, limit)}) AS t;
+    """
+
+
+def nodes_sql(viewport, limit):
+    """Tagged OSM nodes in ``viewport``: (id, latitude, longitude, tags)."""
+    return f"""
+        SELECT id, lat / 1e7 AS latitude, lon / 1e7 AS longitude, tags
+        FROM planet_osm_nodes
+        WHERE {NODE_FILTER_SQL}
+        AND {NODE_RANGE_SQL}
+        LIMIT {int(limit)};
+    """
+
+
+def node_index_sql(table="planet_osm_nodes", brin=False, concurrently=False):
+    """
+    CREATE INDEX statement for the node range predicates: a (lat, lon) btree
+    over the tagged nodes only, or with ``brin`` a BRIN index, far smaller but
+    only selective when the table is stored roughly in spatial order.
+    """
+    method = "brin" if brin else "btree"
+    return f"""
+        CREATE INDEX {"CONCURRENTLY " if concurrently else ""}IF NOT EXISTS {table}_tagged_lat_lon_{method}
+        ON {table} USING {method} (lat, lon)
+        WHERE {NODE_FILTER_SQL}
+    """
+
+
+def iter_buildings(viewport, limit):
+    return iter_rows(buildings_sql(viewport, limit), viewport.sql_params())
+
+
+def iter_nodes(viewport, limit):
+    return iter_rows(nodes_sql(viewport, limit), viewport.sql_params())
+
+
+# md5 over a way's node list and tags; a changed hash means its row is stale
+_WAY_HASH_SQL = "md5(w.nodes::text || coalesce(w.tags::text, ''))"
+
+
+def materialize_way_geometries(full=False):
+    """
+    Builds OSMWayGeometry from planet_osm_ways / planet_osm_nodes in one
+    set-based statement: each highway's node list is unnested with its
+    ordinality, joined to the nodes and aggregated with ST_MakeLine.
+
+    Incremental by default: only ways that are new or whose nodes/tags hash
+    changed are rebuilt, and rows of ways that are gone (or no longer
+    highways) are deleted. Node moves that leave a way's node list unchanged
+    are only picked up with ``full=True``, which rebuilds the table.
+    Returns (rows written, rows deleted).
+    """
+    table = OSMWayGeometry._meta.db_table
+    only_changed = "" if full else f"""
+        AND NOT EXISTS (
+            SELECT 1 FROM {table} g WHERE g.osm_id = w.id AND g.source_hash = {_WAY_HASH_SQL}
+        )
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        deleted = 0
+        if full:
+            cursor.execute(f"TRUNCATE {table}")
+        else:
+            cursor.execute(f"""
+                DELETE FROM {table} g
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM planet_osm_ways w WHERE w.id = g.osm_id AND w.tags::jsonb ? 'highway'
+                )
+            """)
+            deleted = cursor.rowcount
+
+        cursor.execute(f"""
+            WITH ways AS (
+                SELECT w.id, w.nodes,
+                       w.tags::jsonb->>'name' AS name,
+                       w.tags::jsonb->>'highway' AS highway,
+                       {_WAY_HASH_SQL} AS source_hash
+                FROM planet_osm_ways w
+                WHERE w.tags::jsonb ? 'highway'
+                {only_changed}
+            )
+            INSERT INTO {table} (osm_id, name, highway, source_hash, geometry)
+            SELECT ways.id, ways.name, ways.highway, ways.source_hash,
+                   ST_MakeLine(ST_SetSRID(ST_MakePoint(n.lon / 1e7, n.lat / 1e7), 4326) ORDER BY u.ord)
+            FROM ways
+            CROSS JOIN LATERAL unnest(ways.nodes) WITH ORDINALITY AS u(node_id, ord)
+            JOIN planet_osm_nodes n ON n.id = u.node_id
+            GROUP BY ways.id, ways.name, ways.highway, ways.source_hash
+            HAVING count(*) >= 2
+            ON CONFLICT (osm_id) DO UPDATE SET
+                name = EXCLUDED.name,
+                highway = EXCLUDED.highway,
+                source_hash = EXCLUDED.source_hash,
+                geometry = EXCLUDED.geometry
+        """)
+        written = cursor.rowcount
+        cursor.execute(f"ANALYZE {table}")
+    return written, deleted
+
+
+def iter_highway_ways(viewport, limit):
+    """
+    Highway ways in ``viewport``: (osm_id, name, GeoJSON). Uses the GiST
+    index on OSMWayGeometry; until materialize_ways has run, falls back to
+    building each way from planet_osm_nodes on the fly.
+    """
+    if OSMWayGeometry.objects.exists():
+        rows = (
+            OSMWayGeometry.objects
+            .filter(geometry__intersects=viewport.envelope)
+            .annotate(geojson=AsGeoJSON(viewport.simplified("geometry"), precision=settings.GEOJSON_PRECISION))
+            .values_list("osm_id", "name", "geojson")
+        )
+        return rows[:limit].iterator(chunk_size=FETCH_BATCH_SIZE)
+
+    return iter_rows(f"""
+        WITH ways AS (
+            SELECT w.id, w.tags::jsonb->>'name' AS name, ST_MakeLine(ARRAY(
+                SELECT ST_SetSRID(ST_MakePoint(n.lon / 1e7, n.lat / 1e7), 4326)
+                FROM unnest(w.nodes) WITH ORDINALITY AS u(node_id, ord)
+                JOIN planet_osm_nodes n ON n.id = u.node_id
+                ORDER BY u.ord
+            )) AS geometry
+            FROM planet_osm_ways w
+            WHERE w.tags::jsonb ? 'highway'
+        )
+        SELECT id, name, {geojson_sql(viewport.geometry_sql("geometry"))}
+        FROM ways
+        WHERE ST_Intersects(geometry, {envelope_sql})
+        LIMIT {int(limit)};
+    """, viewport.sql_params())
@@ -0,0 +1,149 @@
+"""
+Serialized payload cache for the cached map datasets.
+
+The map views serve every CachedRoad / DITCachedBuildings row as JSON. Rather
+than serializing each geometry on every request, each worker
+keeps the ready JSON bytes (plus gzip and, when the optional ``brotli``
+package is installed, brotli variants) keyed by the dataset's CachedDataset
+version, and only regenerates them after the dataset changes. Each dataset
+is available as the GeoJSON-geometry list the templates read ("json") and as
+a quantized TopoJSON Topology ("topojson", see topojson.encode_topology), in
+each level of detail (see lod).
+"""
+import gzip
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib.gis.db.models.functions import AsGeoJSON
+
+from .lod import lod_column, lod_expression
+from .models import CachedDataset, CachedRoad, DITCachedBuildings
+from .topojson import encode_topology
+
+try:
+    import brotli
+except ImportError:  # Optional; only gzip variants are produced without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Content codings payloads are available in, preferred first
+ENCODINGS = ("br", "gzip") if brotli else ("gzip",)
+
+DATASET_MODELS = {
+    CachedDataset.ROADS: CachedRoad,
+    CachedDataset.BUILDINGS: DITCachedBuildings,
+}
+
+
+class Payload:
+    """Ready-to-serve JSON for one version and format of a dataset, with compressed variants."""
+
+    def __init__(self, name, version, data, format="json"):
+        self.name = name
+        self.version = version
+        self.format = format
+        self.json = data
+        self.gzip = gzip.compress(data, compresslevel=6)
+        self.brotli = brotli.compress(data) if brotli else None
+
+    @property
+    def text(self):
+        """The JSON as a str, for embedding in templates."""
+        return self.json.decode("utf-8")
+
+    def body(self, encoding):
+        """The payload in content coding ``encoding`` ('br', 'gzip' or None)."""
+        return {"br": self.brotli, "gzip": self.gzip}.get(encoding, self.json)
+
+
+def dataset_items(name, viewport=None, zoom=None):
+    """
+    Yields the rows of the dataset as encoded {osm_id, name, geometry} JSON
+    objects, read through a server-side cursor. PostGIS renders the GeoJSON
+    geometry, which is spliced into the output as-is instead of being decoded
+    and re-encoded in Python. Geometries come in the level of detail stored
+    for ``zoom`` (see lod). With a viewport, only rows intersecting its bbox
+    are read (GiST index), at the viewport's zoom.
+    """
+    rows = DATASET_MODELS[name].objects.all()
+    if viewport is not None:
+        rows = rows.filter(geometry__intersects=viewport.envelope)
+        zoom = viewport.zoom
+    geometry = lod_expression(zoom)
+    rows = rows.annotate(
+        geojson=AsGeoJSON(geometry, precision=settings.GEOJSON_PRECISION)
+    ).values_list("osm_id", "name", "geojson")
+    for osm_id, row_name, geojson in rows.iterator(chunk_size=2000):
+        if geojson:
+            yield f'{{"osm_id": {json.dumps(osm_id)}, "name": {json.dumps(row_name)}, "geometry": {geojson}}}'
+        else:
+            logger.warning("Empty geometry in %s dataset row %s. Skipping.", name, osm_id)
+
+
+def _serialize_dataset(name, zoom=None):
+    """Encodes the whole dataset as the [{osm_id, name, geometry}] list the templates expect."""
+    return ("[" + ", ".join(dataset_items(name, zoom=zoom)) + "]").encode("utf-8")
+
+
+def dataset_topology(name, viewport=None, zoom=None):
+    """
+    Encodes the dataset (or its rows in ``viewport``, at the viewport's zoom)
+    in the level of detail for ``zoom`` as a TopoJSON Topology with one object
+    called ``name``.
+    """
+    rows = DATASET_MODELS[name].objects.all()
+    if viewport is not None:
+        rows = rows.filter(geometry__intersects=viewport.envelope)
+        zoom = viewport.zoom
+    geometry = "geometry"
+    if lod_column(zoom) != "geometry":
+        rows = rows.annotate(simplified=lod_expression(zoom))
+        geometry = "simplified"
+    features = (
+        (osm_id, {"name": row_name}, shape)
+        for osm_id, row_name, shape in rows.values_list("osm_id", "name", geometry).iterator(chunk_size=2000)
+    )
+    return encode_topology(name, features)
+
+
+# format -> serializer of a whole dataset
+SERIALIZERS = {
+    "json": _serialize_dataset,
+    "topojson": dataset_topology,
+}
+
+
+class PayloadCache:
+    """Per-worker cache of the latest Payload for each dataset, format and level of detail."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._payloads = {}
+
+    def get(self, name, format="json", zoom=None):
+        """
+        Returns the Payload for the dataset's current version in the level of
+        detail for ``zoom``, regenerating it if stale.
+        """
+        version = CachedDataset.current_version(name)
+        key = (name, format, lod_column(zoom))
+        payload = self._payloads.get(key)
+        if payload is not None and payload.version == version:
+            return payload
+        with self._lock:
+            payload = self._payloads.get(key)
+            if payload is None or payload.version != version:
+                payload = Payload(name, version, SERIALIZERS[format](name, zoom=zoom), format)
+                self._payloads[key] = payload
+                logger.info(
+                    "Serialized %s %s payload v%s at %s (%d bytes, %d gzipped).",
+                    name, format, version, key[2], len(payload.json), len(payload.gzip),
+                )
+            return payload
+
+
+# One cache per worker process.
+payload_cache = PayloadCache()
@@ -0,0 +1,26 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .graph_store import graph_store
+from .models import CachedDataset, CachedRoad, DITCachedBuildings
+
+
+@receiver(post_save, sender=CachedRoad)
+def cached_road_saved(sender, instance, **kwargs):
+    """Bumps the roads version and splices the road into this worker's graph."""
+    version = CachedDataset.bump(CachedDataset.ROADS)
+    graph_store.road_saved(instance, version)
+
+
+@receiver(post_delete, sender=CachedRoad)
+def cached_road_deleted(sender, instance, **kwargs):
+    """Bumps the roads version and drops the road from this worker's graph."""
+    version = CachedDataset.bump(CachedDataset.ROADS)
+    graph_store.road_deleted(instance.osm_id, version)
+
+
+@receiver(post_save, sender=DITCachedBuildings)
+@receiver(post_delete, sender=DITCachedBuildings)
+def cached_building_changed(sender, instance, **kwargs):
+    """Bumps the buildings version so serialized payloads are regenerated."""
+    CachedDataset.bump(CachedDataset.BUILDINGS)
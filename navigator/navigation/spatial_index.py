@@ -0,0 +1,170 @@
+"""
+Spatial indexes over the routing graph: NodeIndex snaps user coordinates to
+the nearest graph node without allocating a Shapely object per vertex per
+request, and EdgeIndex finds where a new path crosses the existing edges.
+
+STRtrees are immutable, so both take later additions into a small pending
+list that is scanned with NumPy and folded into a new tree once it grows
+past REBUILD_PENDING entries; an addition costs O(1) and a lookup stays
+O(log N + REBUILD_PENDING).
+"""
+import numpy as np
+import shapely
+from shapely.strtree import STRtree
+
+REBUILD_PENDING = 1024
+
+# Tolerance, as a fraction of a segment, under which a crossing is taken to
+# be at the segment's end vertex
+CROSSING_EPSILON = 1e-9
+
+
+class NodeIndex:
+    """
+    STRtree over graph node coordinates. Built once alongside the graph and
+    extended with ``add()`` as roads are spliced in; each lookup is O(log N).
+    """
+
+    def __init__(self, nodes):
+        self._build(list(nodes))
+
+    def _build(self, nodes):
+        self._nodes = nodes
+        self._coords = np.array([node[:2] for node in nodes], dtype=float).reshape(-1, 2)
+        self._tree = STRtree(shapely.points(self._coords))
+        self._pending = []
+
+    def __len__(self):
+        return len(self._nodes) + len(self._pending)
+
+    def add(self, nodes):
+        """Indexes nodes added to the graph since the index was built."""
+        self._pending.extend(nodes)
+        if len(self._pending) > REBUILD_PENDING:
+            self._build(self._nodes + self._pending)
+
+    def nearest(self, lng, lat):
+        """Returns the graph node closest to (lng, lat), or None if the index is empty."""
+        return self.nearest_many([(lng, lat)])[0]
+
+    def nearest_many(self, points):
+        """
+        Snaps a sequence of (lng, lat) pairs in one vectorized query.
+        Returns the matching graph nodes in input order.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        if not len(self):
+            return [None] * len(points)
+        if self._nodes:
+            indices = self._tree.nearest(shapely.points(points))
+            nearest = [self._nodes[i] for i in indices]
+            distances = np.hypot(*(self._coords[indices] - points).T)
+        else:
+            nearest = [None] * len(points)
+            distances = np.full(len(points), np.inf)
+        if self._pending:
+            # Same planar lon/lat metric as the tree
+            pending = np.array([node[:2] for node in self._pending], dtype=float)
+            pending_distances = np.hypot(*(points[:, None, :] - pending[None, :, :]).transpose(2, 0, 1))
+            closest = pending_distances.argmin(axis=1)
+            for i, j in enumerate(closest):
+                if pending_distances[i, j] < distances[i]:
+                    nearest[i] = self._pending[j]
+        return nearest
+
+
+class EdgeIndex:
+    """
+    STRtree over graph edges, as segments between their end nodes. ``edges``
+    is a live view of the graph's edges (``graph.edges``): entries of edges
+    that were later removed or split stay in place, and ``crossings`` skips
+    those ``is_live`` rejects, until the pending additions are folded into a
+    new tree built from the view's current contents.
+    """
+
+    def __init__(self, edges):
+        self._source = edges
+        self._build(list(edges))
+
+    def _build(self, edges):
+        self._edges = edges
+        self._segments = np.array(
+            [(u[:2], v[:2]) for u, v in edges], dtype=float
+        ).reshape(-1, 2, 2)
+        self._tree = STRtree(shapely.linestrings(self._segments))
+        self._pending = []
+
+    def add(self, edges):
+        """Indexes edges added to the graph since the index was built."""
+        self._pending.extend(edges)
+        if len(self._pending) > REBUILD_PENDING:
+            self._build(list(self._source))
+
+    def _candidates(self, segments):
+        """(segment index, edge) pairs whose bounding boxes intersect."""
+        pairs = []
+        if self._edges:
+            query, found = self._tree.query(shapely.linestrings(segments))
+            pairs.extend((i, self._edges[j]) for i, j in zip(query.tolist(), found.tolist()))
+        if self._pending:
+            pending = np.array([(u[:2], v[:2]) for u, v in self._pending], dtype=float)
+            seg_min, seg_max = segments.min(axis=1), segments.max(axis=1)
+            pend_min, pend_max = pending.min(axis=1), pending.max(axis=1)
+            overlaps = np.all(
+                (seg_min[:, None, :] <= pend_max[None, :, :]) & (pend_min[None, :, :] <= seg_max[:, None, :]),
+                axis=2,
+            )
+            pairs.extend((i, self._pending[j]) for i, j in zip(*np.nonzero(overlaps)))
+        return pairs
+
+    def crossings(self, segments, is_live):
+        """
+        Where the (K, 2, 2) array of ``segments`` (a new path, in order) crosses
+        live indexed edges. Returns (segment index, t, s, point, edge) tuples:
+        ``edge`` is given with its lower node first, whichever way it was
+        indexed, and is reported once per segment; ``point`` lies at fraction
+        ``t`` along the segment and ``s`` along ``edge`` (from its first node),
+        and is that node or segment vertex exactly when the crossing falls on
+        it. Collinear overlaps are ignored.
+        """
+        segments = np.asarray(segments, dtype=float).reshape(-1, 2, 2)
+        pairs = list(dict.fromkeys(
+            (i, (u, v) if u <= v else (v, u)) for i, (u, v) in self._candidates(segments) if is_live(u, v)
+        ))
+        if not pairs:
+            return []
+        index = np.array([i for i, _ in pairs])
+        a, b = segments[index, 0], segments[index, 1]
+        u = np.array([edge[0][:2] for _, edge in pairs], dtype=float)
+        v = np.array([edge[1][:2] for _, edge in pairs], dtype=float)
+
+        def cross(p, q):
+            return p[:, 0] * q[:, 1] - p[:, 1] * q[:, 0]
+
+        direction, edge_direction, offset = b - a, v - u, u - a
+        denominator = cross(direction, edge_direction)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = cross(offset, edge_direction) / denominator
+            s = cross(offset, direction) / denominator
+        hit = (
+            (np.abs(denominator) > 0)
+            & (t >= -CROSSING_EPSILON) & (t <= 1 + CROSSING_EPSILON)
+            & (s >= -CROSSING_EPSILON) & (s <= 1 + CROSSING_EPSILON)
+        )
+
+        result = []
+        for k in np.nonzero(hit)[0]:
+            i, edge = pairs[k]
+            tk, sk = float(np.clip(t[k], 0.0, 1.0)), float(np.clip(s[k], 0.0, 1.0))
+            if sk <= CROSSING_EPSILON:
+                point = edge[0]
+            elif sk >= 1 - CROSSING_EPSILON:
+                point = edge[1]
+            elif tk <= CROSSING_EPSILON:
+                point = tuple(segments[i, 0].tolist())
+            elif tk >= 1 - CROSSING_EPSILON:
+                point = tuple(segments[i, 1].tolist())
+            else:
+                point = tuple((a[k] + tk * direction[k]).tolist())
+            result.append((int(i), tk, sk, point, edge))
+        return result
@@ -0,0 +1,24 @@
+// Fetches JSON from the cached map data endpoints (roads_data / buildings_data),
+// retrying while the server is still warming the cache (503 + Retry-After),
+// at most MAX_WARM_RETRIES times; a failed fill answers with a growing Retry-After.
+// Any other error response is thrown rather than returned as data.
+const MAX_WARM_RETRIES = 10;
+
+async function fetchWarm(url) {
+    for (let attempt = 0; ; attempt++) {
+        let response = await fetch(url);
+        if (response.status !== 503) {
+            if (!response.ok) {
+                let body = await response.json().catch(() => ({}));
+                throw new Error(body.error || `Request failed with status ${response.status}.`);
+            }
+            return response.json();
+        }
+        if (attempt >= MAX_WARM_RETRIES) {
+            throw new Error(`Data is still unavailable after ${MAX_WARM_RETRIES} retries.`);
+        }
+        let delay = (parseInt(response.headers.get('Retry-After'), 10) || 2) * 1000;
+        console.log(`Cache is warming; retrying in ${delay} ms...`);
+        await new Promise(resolve => setTimeout(resolve, delay));
+    }
+}
@@ -0,0 +1,54 @@
+"""
+Streaming JSON responses.
+
+Large responses are written out as rows are read from the database (through
+server-side cursors) instead of first being built as a Python list and one
+json.dumps string, so memory stays flat in the number of features and the
+first bytes are sent as soon as the first rows arrive.
+"""
+import zlib
+
+try:
+    import brotli
+except ImportError:  # Optional; see payloads.ENCODINGS
+    brotli = None
+
+# Bytes buffered before a chunk is handed to the server
+CHUNK_SIZE = 64 * 1024
+
+
+def json_array_chunks(items):
+    """
+    Yields the JSON array of ``items`` (each an already-encoded JSON value,
+    as str) in UTF-8 chunks of roughly CHUNK_SIZE bytes.
+    """
+    buffer, size = ["["], 1
+    for index, item in enumerate(items):
+        if index:
+            buffer.append(", ")
+            size += 2
+        buffer.append(item)
+        size += len(item)
+        if size >= CHUNK_SIZE:
+            yield "".join(buffer).encode("utf-8")
+            buffer, size = [], 0
+    buffer.append("]")
+    yield "".join(buffer).encode("utf-8")
+
+
+def compressed_chunks(chunks, encoding):
+    """Compresses a stream of byte chunks incrementally in content coding ``encoding`` ('br', 'gzip' or None)."""
+    if encoding is None:
+        yield from chunks
+        return
+    if encoding == "br":
+        compressor = brotli.Compressor()
+        compress, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+        compress, finish = compressor.compress, compressor.flush
+    for chunk in chunks:
+        data = compress(chunk)
+        if data:
+            yield data
+    yield finish()
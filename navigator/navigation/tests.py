@@ -1,3 +1,97 @@
-from django.test import TestCase
+from types import SimpleNamespace
 
-# Create your tests here.
+import networkx as nx
+from django.contrib.gis.geos import LineString
+from django.test import SimpleTestCase
+
+from .graph_store import RoutingGraphStore
+
+
+def _road(osm_id, coords):
+    return SimpleNamespace(osm_id=osm_id, geometry=LineString(coords, srid=4326))
+
+
+class RoutingGraphSpliceTests(SimpleTestCase):
+    """User paths spliced into and removed from a live routing graph; no database needed."""
+
+    def setUp(self):
+        self.store = RoutingGraphStore()
+        self.store._graph = nx.Graph()
+        self.store._version = 0
+        self.save(_road(1, [(0, 0), (0, 4)]))
+
+    def save(self, road):
+        self.store.road_saved(road, self.store._version + 1)
+        self.assertInStep()
+
+    def delete(self, osm_id):
+        self.store.road_deleted(osm_id, self.store._version + 1)
+        self.assertInStep()
+
+    def assertInStep(self):
+        """The graph was updated rather than dropped, and every road's edges are in it."""
+        graph = self.store._graph
+        self.assertIsNotNone(graph)
+        for osm_id, edges in self.store._road_edges.items():
+            for edge in edges:
+                self.assertTrue(graph.has_edge(*edge), f"road {osm_id} edge {edge} missing")
+
+    def edges(self):
+        return sorted(
+            (tuple(sorted((u, v))), frozenset(data["roads"])) for u, v, data in self.store._graph.edges(data=True)
+        )
+
+    def test_path_splits_crossed_road(self):
+        self.save(_road(-1, [(-1, 2), (1, 2)]))
+        self.assertEqual(self.edges(), [
+            (((-1, 2), (0, 2)), {-1}),
+            (((0, 0), (0, 2)), {1}),
+            (((0, 2), (0, 4)), {1}),
+            (((0, 2), (1, 2)), {-1}),
+        ])
+        self.assertEqual(self.store._road_edges[1], [((0, 0), (0, 2)), ((0, 2), (0, 4))])
+
+    def test_removing_path_merges_road_back(self):
+        before = self.edges()
+        weight = self.store._graph[(0, 0)][(0, 4)]["weight"]
+        self.save(_road(-1, [(-1, 2), (1, 2)]))
+        self.delete(-1)
+        self.assertEqual(self.edges(), before)
+        self.assertAlmostEqual(self.store._graph[(0, 0)][(0, 4)]["weight"], weight)
+        self.assertEqual(self.store._road_edges[1], [((0, 0), (0, 4))])
+
+    def test_path_added_after_a_removal(self):
+        self.save(_road(-1, [(-1, 0.5), (1, 1), (-1, 1.5), (1, 2)]))
+        self.delete(-1)
+        self.save(_road(-2, [(-1, 3), (1, 3)]))
+        self.assertEqual(self.store._road_edges[1], [((0, 0), (0, 3)), ((0, 3), (0, 4))])
+        self.assertEqual(self.store._road_edges[-2], [((-1, 3), (0, 3)), ((0, 3), (1, 3))])
+
+    def test_crossing_paths_stay_split_while_either_remains(self):
+        self.save(_road(-1, [(-1, 2), (1, 2)]))
+        self.save(_road(-2, [(0.5, 1), (0.5, 3)]))
+        self.delete(-1)
+        self.assertNotIn((0, 2), self.store._graph)
+        self.assertNotIn((0.5, 2), self.store._graph)
+        self.assertEqual(self.store._road_edges[-2], [((0.5, 1), (0.5, 3))])
+
+    def test_derived_graphs_are_updated_in_place(self):
+        contracted = self.store.contracted_graph()
+        csr = self.store.csr_graph()
+        self.save(_road(-1, [(-1, 2), (1, 2)]))
+        self.assertIs(self.store.contracted_graph(), contracted)
+        self.assertIs(self.store.csr_graph(), csr)
+
+        graph = self.store._graph
+        expected = nx.shortest_path_length(graph, (-1, 2), (0, 0), weight="weight")
+        self.assertIn((0, 2), contracted.graph)
+        self.assertAlmostEqual(
+            nx.shortest_path_length(contracted.graph, (-1, 2), (0, 0), weight="weight"), expected
+        )
+        self.assertEqual(csr.shortest_path((-1, 2), (0, 0)), [[-1, 2], [0, 2], [0, 0]])
+
+        self.delete(-1)
+        self.assertNotIn((0, 2), contracted.graph)
+        self.assertEqual(csr.shortest_path((0, 0), (0, 4)), [[0, 0], [0, 4]])
+        with self.assertRaises(nx.NetworkXNoPath):
+            csr.shortest_path((-1, 2), (0, 0))
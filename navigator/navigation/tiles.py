@@ -0,0 +1,184 @@
+"""
+Mapbox Vector Tiles for the map layers.
+
+Tiles are encoded by PostGIS (ST_AsMVT) so only the features inside the
+requested tile are read and sent. Encoded tiles are kept in a per-worker LRU
+cache and, when settings.TILE_CACHE_DIR is set, on disk. Cache keys include
+the dataset version, so tiles of the cached datasets are re-encoded after
+CachedRoad / DITCachedBuildings change; the planet_osm_* layers are treated
+as static imports.
+"""
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection
+
+from .lod import lod_column
+from .models import CachedDataset, CachedRoad, DITCachedBuildings
+from .viewport import MAX_ZOOM
+
+logger = logging.getLogger(__name__)
+
+# layer name -> how to read it. ``geom`` is an SQL expression for the feature
+# geometry in ``srid``; ``lod`` layers encode the simplified copy stored for
+# the tile's zoom (see lod); ``version`` names the CachedDataset that
+# invalidates the layer's tiles (None for static OSM tables).
+TILE_LAYERS = {
+    "roads": {
+        "table": CachedRoad._meta.db_table,
+        "geom": "geometry",
+        "columns": "osm_id, name",
+        "where": "TRUE",
+        "srid": 4326,
+        "lod": True,
+        "version": CachedDataset.ROADS,
+    },
+    "buildings": {
+        "table": DITCachedBuildings._meta.db_table,
+        "geom": "geometry",
+        "columns": "osm_id, name",
+        "where": "TRUE",
+        "srid": 4326,
+        "lod": True,
+        "version": CachedDataset.BUILDINGS,
+    },
+    "osm_buildings": {
+        "table": "planet_osm_polygon",
+        "geom": "way",
+        "columns": "osm_id, name, landuse, building",
+        "where": "building IS NOT NULL",
+        "srid": settings.OSM_SRID,
+        "lod": False,
+        "version": None,
+    },
+    "osm_roads": {
+        "table": "planet_osm_line",
+        "geom": "way",
+        "columns": "osm_id, name, highway",
+        "where": "highway IS NOT NULL",
+        "srid": settings.OSM_SRID,
+        "lod": False,
+        "version": None,
+    },
+}
+
+
+def tile_is_valid(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def layer_version(layer):
+    """Version that tiles of ``layer`` are cached under."""
+    dataset = TILE_LAYERS[layer]["version"]
+    return CachedDataset.current_version(dataset) if dataset else 0
+
+
+def encode_tile(layer, z, x, y):
+    """Encodes one tile of ``layer`` with ST_AsMVT and returns the protobuf bytes."""
+    spec = TILE_LAYERS[layer]
+    # Filter on the indexed geometry; encode the zoom's simplified copy when there is one
+    output = spec["geom"]
+    if spec["lod"] and lod_column(z) != "geometry":
+        output = f"COALESCE({lod_column(z)}, {spec['geom']})"
+    sql = f"""
+        WITH bounds AS (
+            SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS geom
+        ),
+        features AS (
+            SELECT {spec["columns"]}, {spec["geom"]} AS geom, {output} AS output_geom
+            FROM {spec["table"]}
+            WHERE {spec["where"]}
+        ),
+        mvtgeom AS (
+            SELECT {spec["columns"]},
+                   ST_AsMVTGeom(ST_Transform(features.output_geom, 3857), bounds.geom, 4096, 64, true) AS geom
+            FROM features, bounds
+            WHERE features.geom && ST_Transform(bounds.geom, {spec["srid"]})
+        )
+        SELECT ST_AsMVT(mvtgeom.*, %(layer)s, 4096, 'geom') FROM mvtgeom;
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {"z": z, "x": x, "y": y, "layer": layer})
+        row = cursor.fetchone()
+    return bytes(row[0]) if row and row[0] is not None else b""
+
+
+class TileCache:
+    """
+    LRU cache of encoded tiles, backed by TILE_CACHE_DIR on disk when it is
+    configured so tiles survive worker restarts and are shared between workers.
+    """
+
+    def __init__(self, max_entries):
+        self._lock = threading.Lock()
+        self._tiles = OrderedDict()
+        self.max_entries = max_entries
+        self._disk_versions = {}  # layer -> version whose on-disk directory is current
+
+    def _disk_path(self, key):
+        layer, version, z, x, y = key
+        return os.path.join(settings.TILE_CACHE_DIR, layer, str(version), str(z), str(x), f"{y}.pbf")
+
+    def _prune_disk(self, layer, version):
+        """
+        Removes the on-disk tiles of ``layer``'s older versions the first time
+        this process sees ``version``; tiles of old versions are never served again.
+        """
+        with self._lock:
+            if self._disk_versions.get(layer) == version:
+                return
+            self._disk_versions[layer] = version
+        layer_dir = os.path.join(settings.TILE_CACHE_DIR, layer)
+        try:
+            # Only older versions: a worker that read the version just before a bump must not delete the newer one
+            stale = [name for name in os.listdir(layer_dir) if name.isdigit() and int(name) < version]
+        except OSError:
+            return
+        for name in stale:
+            shutil.rmtree(os.path.join(layer_dir, name), ignore_errors=True)
+        if stale:
+            logger.info("Removed %d stale %s tile cache version(s) from disk.", len(stale), layer)
+
+    def get(self, layer, z, x, y):
+        """Returns (version, tile bytes), encoding the tile on a cache miss."""
+        version = layer_version(layer)
+        key = (layer, version, z, x, y)
+        with self._lock:
+            if key in self._tiles:
+                self._tiles.move_to_end(key)
+                return version, self._tiles[key]
+
+        tile = None
+        path = None
+        if settings.TILE_CACHE_DIR:
+            self._prune_disk(layer, version)
+            path = self._disk_path(key)
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                tile = f.read()
+        if tile is None:
+            tile = encode_tile(layer, z, x, y)
+            if path:
+                try:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    tmp_path = f"{path}.{os.getpid()}.tmp"
+                    with open(tmp_path, "wb") as f:
+                        f.write(tile)
+                    os.replace(tmp_path, path)
+                except OSError as e:
+                    logger.warning("Could not write tile %s to disk cache: %s", path, e)
+
+        with self._lock:
+            self._tiles[key] = tile
+            self._tiles.move_to_end(key)
+            while len(self._tiles) > self.max_entries:
+                self._tiles.popitem(last=False)
+        return version, tile
+
+
+# One cache per worker process.
+tile_cache = TileCache(settings.TILE_CACHE_MAX_ENTRIES)
@@ -0,0 +1,103 @@
+"""
+Compact coordinate encodings for the map data endpoints.
+
+GeoJSON coordinates are cut to settings.GEOJSON_PRECISION decimals: PostGIS
+does it for the geometries it encodes (ST_AsGeoJSON's maxdecimaldigits) and
+``round_coordinates`` for the coordinate lists built in Python (routes).
+
+``encode_topology`` writes features as a TopoJSON Topology instead: positions
+are quantized to an integer grid over the features' bbox (the ``transform``)
+and every line and ring becomes an arc of delta-encoded integer offsets,
+mostly numbers of a few digits rather than pairs of full-precision floats.
+Arcs are not shared between features, which keeps encoding a single pass;
+the output is still plain TopoJSON that topojson-client's ``feature()``
+decodes back to GeoJSON.
+"""
+import json
+
+import numpy as np
+from django.conf import settings
+
+
+def round_coordinates(coords, digits=None):
+    """``coords`` (N lon/lat[/z] positions) as nested lists rounded to ``digits`` decimals."""
+    digits = settings.GEOJSON_PRECISION if digits is None else digits
+    return np.round(np.asarray(coords, dtype=np.float64), digits).tolist()
+
+
+class _TopologyEncoder:
+    """Quantizes positions onto the Topology's grid and collects the arcs."""
+
+    def __init__(self, bbox, quantization):
+        min_x, min_y, max_x, max_y = bbox
+        self.translate = np.array([min_x, min_y])
+        # quantization positions per axis span the bbox; a zero-width axis gets a unit step
+        self.scale = np.array([
+            (max_x - min_x) / (quantization - 1) or 1.0,
+            (max_y - min_y) / (quantization - 1) or 1.0,
+        ])
+        self.arcs = []
+
+    def quantize(self, coords):
+        positions = np.asarray(coords, dtype=np.float64).reshape(-1, np.shape(coords)[-1])[:, :2]
+        return np.round((positions - self.translate) / self.scale).astype(np.int64)
+
+    def arc(self, coords, min_points):
+        """Adds the line or ring ``coords`` as a delta-encoded arc and returns its index."""
+        quantized = self.quantize(coords)
+        # Drop positions that fall on the same grid cell as their predecessor,
+        # unless that would leave too few for a valid line (2) or ring (4)
+        moved = np.ones(len(quantized), dtype=bool)
+        moved[1:] = np.any(quantized[1:] != quantized[:-1], axis=1)
+        if moved.sum() >= min_points:
+            quantized = quantized[moved]
+        deltas = np.vstack([quantized[:1], np.diff(quantized, axis=0)])
+        self.arcs.append(deltas.tolist())
+        return len(self.arcs) - 1
+
+    def rings(self, polygon):
+        return [[self.arc(ring, 4)] for ring in polygon]
+
+    def geometry(self, geometry):
+        """TopoJSON geometry object for a GEOS geometry (coordinates as in GeoJSON)."""
+        kind, coords = geometry.geom_type, geometry.coords
+        if kind == "Point":
+            return {"type": kind, "coordinates": self.quantize(coords)[0].tolist()}
+        if kind == "MultiPoint":
+            return {"type": kind, "coordinates": self.quantize(coords).tolist()}
+        if kind == "LineString":
+            return {"type": kind, "arcs": [self.arc(coords, 2)]}
+        if kind == "MultiLineString":
+            return {"type": kind, "arcs": [[self.arc(line, 2)] for line in coords]}
+        if kind == "Polygon":
+            return {"type": kind, "arcs": self.rings(coords)}
+        if kind == "MultiPolygon":
+            return {"type": kind, "arcs": [self.rings(polygon) for polygon in coords]}
+        return {"type": "GeometryCollection", "geometries": [self.geometry(part) for part in geometry]}
+
+
+def encode_topology(name, features, quantization=None):
+    """
+    Encodes ``features`` ((id, properties, GEOS geometry) tuples) as a TopoJSON
+    Topology with one GeometryCollection object called ``name``, as UTF-8 bytes.
+    """
+    quantization = quantization or settings.TOPOJSON_QUANTIZATION
+    features = [feature for feature in features if feature[2] is not None and not feature[2].empty]
+    topology = {"type": "Topology", "objects": {name: {"type": "GeometryCollection", "geometries": []}}, "arcs": []}
+    if not features:
+        return json.dumps(topology, separators=(",", ":")).encode("utf-8")
+
+    extents = np.array([geometry.extent for _, _, geometry in features])
+    bbox = [float(extents[:, 0].min()), float(extents[:, 1].min()), float(extents[:, 2].max()), float(extents[:, 3].max())]
+    encoder = _TopologyEncoder(bbox, quantization)
+    geometries = topology["objects"][name]["geometries"]
+    for feature_id, properties, geometry in features:
+        encoded = encoder.geometry(geometry)
+        encoded["id"] = feature_id
+        encoded["properties"] = properties
+        geometries.append(encoded)
+
+    topology["bbox"] = bbox
+    topology["transform"] = {"scale": encoder.scale.tolist(), "translate": encoder.translate.tolist()}
+    topology["arcs"] = encoder.arcs
+    return json.dumps(topology, separators=(",", ":")).encode("utf-8")
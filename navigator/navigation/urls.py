@@ -53,6 +53,15 @@ urlpatterns = [
     # URL for listing recent added roads
     path('recent-roads/', views.recent_added_roads, name='recent_added_roads'),
 
+    # JSON data endpoints fetched by the map pages (ETag / conditional GET)
+    path('data/roads/', views.roads_data, name='roads_data'),
+    path('data/buildings/', views.buildings_data, name='buildings_data'),
+    path('data/nodes/', views.nodes_data, name='nodes_data'),
+    path('data/osm/<str:layer>/', views.osm_features, name='osm_features'),
+
+    # Mapbox Vector Tiles for roads and buildings
+    path('tiles/<str:layer>/<int:z>/<int:x>/<int:y>.pbf', views.vector_tile, name='vector_tile'),
+
     # Intro page
     path('intro/', TemplateView.as_view(template_name="intro.html"), name='intro'),
 ]
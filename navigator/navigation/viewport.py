@@ -0,0 +1,144 @@
+"""
+Viewport (bbox / zoom) parameters for the map data paths.
+
+Map pages pass ``?bbox=min_lng,min_lat,max_lng,max_lat`` (Leaflet's
+``map.getBounds().toBBoxString()``) and optionally ``&zoom=z``. Queries then
+only return features intersecting the bbox, through the spatial indexes, and
+when a zoom is given simplify geometry to about half a pixel at that zoom, so
+payloads scale with what is on screen rather than with the whole dataset.
+"""
+import math
+
+from django.contrib.gis.db.models.functions import GeoFunc
+from django.contrib.gis.geos import Polygon
+
+# Case-study areas the OSM-backed views fall back to when no bbox is given
+CASE_STUDY_BBOX = (39.271655, -6.816286, 39.284623, -6.797216)
+UNIVERSITY_BLOCKS_BBOX = (39.273264, -6.817276, 39.288407, -6.807517)
+
+MAX_ZOOM = 22
+TILE_SIZE = 256
+
+
+class SimplifyPreserveTopology(GeoFunc):
+    function = "ST_SimplifyPreserveTopology"
+
+
+def pixel_tolerance(zoom):
+    """Half a screen pixel in degrees at ``zoom``: the simplification tolerance for that zoom."""
+    return 360.0 / (TILE_SIZE * 2 ** zoom) / 2
+
+
+class Viewport:
+    """A lon/lat bbox (EPSG:4326) plus the optional map zoom it is drawn at."""
+
+    def __init__(self, min_lng, min_lat, max_lng, max_lat, zoom=None):
+        self.min_lng = min_lng
+        self.min_lat = min_lat
+        self.max_lng = max_lng
+        self.max_lat = max_lat
+        self.zoom = zoom
+
+    @property
+    def bbox(self):
+        return (self.min_lng, self.min_lat, self.max_lng, self.max_lat)
+
+    @property
+    def envelope(self):
+        polygon = Polygon.from_bbox(self.bbox)
+        polygon.srid = 4326
+        return polygon
+
+    @property
+    def tolerance(self):
+        """Half a screen pixel in degrees at ``zoom``, or None when no zoom was given."""
+        if self.zoom is None:
+            return None
+        return pixel_tolerance(self.zoom)
+
+    @property
+    def key(self):
+        """Short stable identifier of the viewport, for ETags."""
+        bbox = ",".join(f"{value:.6f}" for value in self.bbox)
+        return f"{bbox}-z{'' if self.zoom is None else self.zoom}"
+
+    def sql_params(self):
+        """Named parameters for the envelope (and tolerance) used by ``envelope_sql`` / ``geometry_sql``."""
+        return {
+            "min_lng": self.min_lng,
+            "min_lat": self.min_lat,
+            "max_lng": self.max_lng,
+            "max_lat": self.max_lat,
+            "tolerance": self.tolerance,
+        }
+
+    def geometry_sql(self, expression):
+        """Wraps a 4326 geometry SQL expression in the zoom's simplification, if any."""
+        if self.zoom is None:
+            return expression
+        return f"ST_SimplifyPreserveTopology({expression}, %(tolerance)s)"
+
+    def simplified(self, field):
+        """ORM counterpart of ``geometry_sql`` for a geometry field name."""
+        if self.zoom is None:
+            return field
+        return SimplifyPreserveTopology(field, self.tolerance)
+
+
+# SQL for the viewport envelope; bind with Viewport.sql_params()
+envelope_sql = "ST_MakeEnvelope(%(min_lng)s, %(min_lat)s, %(max_lng)s, %(max_lat)s, 4326)"
+
+
+def parse_zoom(request):
+    """
+    Reads ``zoom`` from the query string; None when it is not given.
+    Raises ValueError for a malformed or out-of-range value.
+    """
+    raw_zoom = request.GET.get("zoom")
+    if not raw_zoom:
+        return None
+    try:
+        zoom = int(raw_zoom)
+    except ValueError:
+        raise ValueError("zoom must be an integer.")
+    if not 0 <= zoom <= MAX_ZOOM:
+        raise ValueError(f"zoom must be between 0 and {MAX_ZOOM}.")
+    return zoom
+
+
+def parse_viewport(request, default=None):
+    """
+    Reads ``bbox`` and ``zoom`` from the query string. Falls back to
+    ``default`` (a bbox tuple) when no bbox is given; returns None when there
+    is no bbox at all.
+    Raises ValueError for malformed or out-of-range values.
+    """
+    raw_bbox = request.GET.get("bbox")
+
+    if raw_bbox:
+        parts = raw_bbox.split(",")
+        if len(parts) != 4:
+            raise ValueError("bbox must be 'min_lng,min_lat,max_lng,max_lat'.")
+        try:
+            bbox = [float(part) for part in parts]
+        except ValueError:
+            raise ValueError("bbox values must be numbers.")
+    elif default is not None:
+        bbox = list(default)
+    else:
+        bbox = None
+
+    zoom = parse_zoom(request)
+
+    if bbox is None:
+        return None
+    if not all(math.isfinite(value) for value in bbox):
+        raise ValueError("bbox values must be finite.")
+    # ~0.1 m; keeps Viewport.key identical to the bbox actually queried
+    bbox = [round(value, 6) for value in bbox]
+    # Leaflet reports bounds past the antimeridian/poles when zoomed out; clamp them
+    min_lng, min_lat = max(bbox[0], -180.0), max(bbox[1], -90.0)
+    max_lng, max_lat = min(bbox[2], 180.0), min(bbox[3], 90.0)
+    if min_lng >= max_lng or min_lat >= max_lat:
+        raise ValueError("bbox must have its minimums below its maximums, within -180..180 / -90..90.")
+    return Viewport(min_lng, min_lat, max_lng, max_lat, zoom)
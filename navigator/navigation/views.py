@@ -9,84 +9,38 @@ from decimal import Decimal # Used for potential float conversions from DB
 from .models import *
 # Django imports
 from django.shortcuts import render, redirect
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
 from django.contrib.gis.geos import GEOSGeometry, Point as DjangoPoint, LineString as DjangoLineString # Renamed to avoid clash with Shapely
 from django.contrib.gis.db.models.functions import AsGeoJSON
-from django.db import connection
-from django.db.models import Max
+from django.db import connection, transaction
+from django.conf import settings
 from django import forms
 
-# Shapely imports for geometric operations (crucial for graph building and nearest_points)
-from shapely.geometry import LineString as ShapelyLineString, Point as ShapelyPoint, MultiPoint as ShapelyMultiPoint
-from shapely.ops import nearest_points
-
 # Your models (ensure these are correctly defined in your models.py)
-from .models import Road, BufferedRoad, CachedRoad, DITCachedBuildings
+from .models import Road, BufferedRoad, CachedRoad, CachedDataset
 
 # Your forms (ensure this is correctly defined in your forms.py)
 from .forms import RouteForm
 
+from .alternatives import alternative_routes
+from .cache_fill import ensure_warm, retry_after
+from .geodesy import path_length
+from .graph_store import WEIGHT_UNIT, graph_store
+from .lod import lod_column
+from .osm_queries import OSM_LAYERS, feature_collection_sql, fetch_json, iter_nodes, rows_json_sql
+from .payloads import ENCODINGS, SERIALIZERS, dataset_items, dataset_topology, payload_cache
+from .streaming import compressed_chunks, json_array_chunks
+from .tiles import TILE_LAYERS, tile_cache, tile_is_valid
+from .topojson import round_coordinates
+from .viewport import CASE_STUDY_BBOX, parse_viewport, parse_zoom
+from .walkable_area import walkable_area_for_zoom
+
 # ---
 # General Utility Functions (Optional, but good practice for reusability)
 # ---
 
-def _get_geojson_from_db_result(geojson_string_or_dict):
-    """
-    Helper to ensure geometry is a Python dictionary, parsing if it's a string.
-    Handles potential malformed JSON by returning None.
-    """
-    if isinstance(geojson_string_or_dict, dict):
-        return geojson_string_or_dict
-    elif isinstance(geojson_string_or_dict, str):
-        try:
-            return json.loads(geojson_string_or_dict)
-        except json.JSONDecodeError as e:
-            print(f"Error decoding JSON geometry: {e}")
-            return None
-    return None # For unexpected types
-
-def _build_networkx_graph_from_cached_roads(cached_road_queryset):
-    """
-    Builds a NetworkX graph from a queryset of CachedRoad objects.
-    Returns the graph and a list of successfully processed road data (as dicts).
-    """
-    G = nx.Graph()
-    processed_road_data = []
-
-    for road_obj in cached_road_queryset:
-        try:
-            geometry_dict = _get_geojson_from_db_result(road_obj.geometry)
-            if not geometry_dict or "coordinates" not in geometry_dict:
-                print(f"Warning: CachedRoad {road_obj.osm_id} geometry is invalid or missing 'coordinates'. Skipping.")
-                continue
-
-            # Add to processed road data list
-            processed_road_data.append({
-                "osm_id": road_obj.osm_id,
-                "name": road_obj.name,
-                "geometry": geometry_dict # Keep as dict for template
-            })
-
-            # Build NetworkX graph using Shapely geometries
-            linestring = ShapelyLineString(geometry_dict["coordinates"])
-            
-            # Iterate through points of the linestring to add edges
-            for i in range(len(linestring.coords) - 1):
-                # Use tuple(point) for NetworkX nodes to ensure hashability
-                start_node = tuple(linestring.coords[i])
-                end_node = tuple(linestring.coords[i + 1])
-                
-                # Calculate distance between Shapely Points
-                distance = ShapelyPoint(start_node).distance(ShapelyPoint(end_node))
-                G.add_edge(start_node, end_node, weight=distance)
-
-        except Exception as e:
-            print(f"An error occurred processing CachedRoad {road_obj.osm_id} for graph: {e}. Skipping this road.")
-            # Optionally, delete the malformed entry: road_obj.delete()
-            continue
-    return G, processed_road_data
-
 # ---
 # 1. map_view (Basic Road Display)
 # ---
@@ -96,7 +50,7 @@ def map_view(request):
     Renders a map displaying roads from the Road model.
     This view uses Django's GIS features for direct geometry handling.
     """
-    roads = Road.objects.annotate(geojson=AsGeoJSON("geom"))
+    roads = Road.objects.annotate(geojson=AsGeoJSON("geom", precision=settings.GEOJSON_PRECISION))
     road_data = []
     for road in roads:
         try:
@@ -174,75 +128,27 @@ def generate_route(request):
 def map_new_polygons(request):
     """
     Fetches and displays building polygons and road data directly from raw OSM tables
-    (planet_osm_polygon and planet_osm_ways) within a defined bounding box.
+    (planet_osm_polygon and planet_osm_ways) within the requested bbox
+    (?bbox=min_lng,min_lat,max_lng,max_lat&zoom=z), defaulting to the case-study area.
     """
-    case_study_bbox = (39.271655, -6.816286, 39.284623, -6.797216) # (min_lng, min_lat, max_lng, max_lat)
+    try:
+        viewport = parse_viewport(request, default=CASE_STUDY_BBOX)
+    except ValueError as e:
+        return render(request, "error.html", {"message": f"Invalid viewport: {e}"})
 
-    building_data = []
+    # PostgreSQL builds the JSON arrays (json_agg); they go into the page as-is
     try:
-        with connection.cursor() as cursor:
-            cursor.execute(f"""
-                SELECT osm_id, name, landuse, building, ST_AsGeoJSON(ST_Transform(way, 4326)) AS geometry
-                FROM planet_osm_polygon
-                WHERE building IS NOT NULL
-                AND ST_Intersects(
-                    ST_Transform(way, 4326),
-                    ST_MakeEnvelope({case_study_bbox[0]}, {case_study_bbox[1]}, {case_study_bbox[2]}, {case_study_bbox[3]}, 4326)
-                )
-                LIMIT 1000;
-            """)
-            building_rows = cursor.fetchall()
-            for row in building_rows:
-                geom_dict = _get_geojson_from_db_result(row[4])
-                if geom_dict:
-                    building_data.append({
-                        "osm_id": row[0],
-                        "name": row[1] or None,
-                        "landuse": row[2] or None,
-                        "building": row[3] or None,
-                        "geometry": geom_dict
-                    })
+        building_data_json = fetch_json(rows_json_sql("buildings", viewport, limit=1000), viewport)
     except Exception as e:
         print(f"Error fetching building data for map_new_polygons: {e}")
         return render(request, "error.html", {"message": f"Error fetching building data: {e}"})
 
-    road_data = []
     try:
-        with connection.cursor() as cursor:
-            # Note: The original query for roads from planet_osm_ways was complex and might be slow.
-            # This version uses a simpler approach if 'nodes' column is directly available or
-            # assumes 'way' column for LineString geometry like planet_osm_line.
-            # If planet_osm_ways stores nodes as an array of IDs, the original query might be necessary.
-            # For this rewrite, I'm adapting to a common case where 'way' is a geometry column.
-            # If your 'planet_osm_ways' table has a 'way' column of type geometry, this should work.
-            # Otherwise, you'll need to re-insert your original complex query for 'planet_osm_ways'.
-            cursor.execute(f"""
-                SELECT osm_id, name, highway, ST_AsGeoJSON(ST_Transform(way, 4326)) AS geometry
-                FROM planet_osm_line
-                WHERE highway IS NOT NULL
-                AND ST_Intersects(
-                    ST_Transform(way, 4326),
-                    ST_MakeEnvelope({case_study_bbox[0]}, {case_study_bbox[1]}, {case_study_bbox[2]}, {case_study_bbox[3]}, 4326)
-                )
-                LIMIT 1000;
-            """)
-            road_rows = cursor.fetchall()
-            for row in road_rows:
-                geom_dict = _get_geojson_from_db_result(row[3])
-                if geom_dict:
-                    road_data.append({
-                        "osm_id": row[0],
-                        "name": row[1] or None,
-                        "highway": row[2] or None,
-                        "geometry": geom_dict
-                    })
+        road_data_json = fetch_json(rows_json_sql("roads", viewport, limit=1000), viewport)
     except Exception as e:
         print(f"Error fetching road data for map_new_polygons: {e}")
         return render(request, "error.html", {"message": f"Error fetching road data: {e}"})
 
-    building_data_json = json.dumps(building_data)
-    road_data_json = json.dumps(road_data)
-
     print("Serialized Building Data JSON (first 500 chars):", building_data_json[:500])
     print("Serialized Road Data JSON (first 500 chars):", road_data_json[:500])
 
@@ -257,10 +163,23 @@ def map_new_polygons(request):
 
 def map_view_polygons(request):
     """
-    View to render road polygons on the map from BufferedRoad model.
-    Assumes BufferedRoad.geom is a PolygonField.
+    View to render the walkable area: the BufferedRoad polygons dissolved into
+    one geometry (see walkable_area), at the level of detail for ?zoom= (the
+    most detailed without it). Until buffer_roads has built it, falls back to
+    the individual BufferedRoad polygons.
     """
-    buffered_roads = BufferedRoad.objects.annotate(geojson=AsGeoJSON("geom"))
+    try:
+        zoom = parse_zoom(request)
+    except ValueError as e:
+        return render(request, "error.html", {"message": f"Invalid zoom: {e}"})
+
+    area = walkable_area_for_zoom(zoom)
+    if area is not None:
+        # One pre-simplified geometry; its GeoJSON goes into the page as-is
+        road_data_json = f'[{{"name": "Walkable area", "geojson": {area.geojson}}}]'
+        return render(request, "map_polygons.html", {"road_data": road_data_json})
+
+    buffered_roads = BufferedRoad.objects.annotate(geojson=AsGeoJSON("geom", precision=settings.GEOJSON_PRECISION))
     road_data = []
     for road in buffered_roads:
         try:
@@ -285,89 +204,15 @@ def map_view_polygons(request):
 
 def map_roads(request):
     """
-    Fetches and displays road data from the CachedRoad model.
-    Populates CachedRoad from raw OSM data if the cache is empty.
-    Ensures geometry is stored as a JSON string in CachedRoad.
+    Displays road data from the CachedRoad model; the page fetches it from roads_data.
+    Until the cache has been filled it is warmed in the background (see cache_fill)
+    rather than inside this request; roads_data answers "warming" until then.
     """
-    print("Starting map_roads view...")
-    start_time = time.time()
-
-    case_study_bbox = (39.271655, -6.816286, 39.284623, -6.797216)
-
-    road_data = []
-    cached_roads_count = CachedRoad.objects.count()
-
-    if cached_roads_count > 0:
+    if ensure_warm(CachedDataset.ROADS):
         print("Using cached road data...")
-        for road_obj in CachedRoad.objects.all():
-            geom_dict = _get_geojson_from_db_result(road_obj.geometry)
-            if geom_dict:
-                road_data.append({
-                    "osm_id": road_obj.osm_id,
-                    "name": road_obj.name,
-                    "geometry": geom_dict # Keep as dict for template
-                })
-            else:
-                print(f"Warning: Malformed geometry in CachedRoad {road_obj.osm_id}. Skipping.")
-                # Option to delete malformed data: road_obj.delete()
     else:
-        print("Executing SQL query to fetch road data and populate cache...")
-        query_start_time = time.time()
-        try:
-            with connection.cursor() as cursor:
-                # Re-inserting your original complex query for planet_osm_ways
-                cursor.execute(f"""
-                    SELECT id, tags::jsonb->>'name' AS name, ST_AsGeoJSON(ST_Transform(ST_MakeLine(ARRAY(
-                        SELECT ST_SetSRID(ST_MakePoint(n.lon / 1e7, n.lat / 1e7), 4326)
-                        FROM unnest(nodes) AS node_id
-                        JOIN planet_osm_nodes n ON n.id = node_id
-                    ))) AS geometry
-                    FROM planet_osm_ways
-                    WHERE tags::jsonb ? 'highway'
-                    AND ST_Intersects(
-                        ST_MakeLine(ARRAY(
-                            SELECT ST_SetSRID(ST_MakePoint(n.lon / 1e7, n.lat / 1e7), 4326)
-                            FROM unnest(nodes) AS node_id
-                            JOIN planet_osm_nodes n ON n.id = node_id
-                        )),
-                        ST_MakeEnvelope({case_study_bbox[0]}, {case_study_bbox[1]}, {case_study_bbox[2]}, {case_study_bbox[3]}, 4326)
-                    )
-                    LIMIT 2000;
-                """)
-                road_rows = cursor.fetchall()
-
-            print(f"SQL query executed. Time taken: {time.time() - query_start_time:.2f} seconds")
-            print(f"Number of roads fetched: {len(road_rows)}")
-
-            print("Saving queried roads to the database cache...")
-            for row in road_rows:
-                geometry_string = row[2] # ST_AsGeoJSON returns a string
-                geom_dict = _get_geojson_from_db_result(geometry_string)
-                if geom_dict:
-                    CachedRoad.objects.update_or_create(
-                        osm_id=row[0],
-                        defaults={"name": row[1] or "Unnamed Road", "geometry": geometry_string}
-                    )
-                    road_data.append({
-                        "osm_id": row[0],
-                        "name": row[1] or "Unnamed Road",
-                        "geometry": geom_dict # Convert back to dict for template
-                    })
-                else:
-                    print(f"Warning: Geometry for OSM ID {row[0]} is malformed after DB fetch. Skipping save.")
-
-        except Exception as e:
-            print(f"Error during SQL query execution for map_roads: {e}")
-            return render(request, "error.html", {"message": "Error fetching road data."})
-
-    try:
-        road_data_json = json.dumps(road_data)
-    except Exception as e:
-        print(f"Error during JSON serialization in map_roads: {e}")
-        return render(request, "error.html", {"message": "Error serializing road data."})
-
-    print(f"map_roads view completed. Total time: {time.time() - start_time:.2f} seconds")
-    return render(request, "map_roads.html", {"road_data_json": road_data_json})
+        print("Road cache has not been filled yet; warming it in the background...")
+    return render(request, "map_roads.html")
 
 # ---
 # 6. map_nodes (OSM Nodes)
@@ -375,36 +220,19 @@ def map_roads(request):
 
 def map_nodes(request):
     """
-    Fetches and displays individual OSM nodes within a defined bounding box.
+    Displays individual OSM nodes; the page fetches them from nodes_data.
     """
-    print("Starting map_nodes view...")
-    start_time = time.time()
+    return render(request, "map_nodes.html")
 
-    case_study_bbox = (39.271655, -6.816286, 39.284623, -6.797216)
-
-    node_data = []
+def _node_items(viewport):
+    """
+    Yields the OSM nodes in ``viewport`` as encoded JSON objects, read through
+    a server-side cursor (osm_queries.iter_rows) so only one batch of rows is held at a time.
+    """
+    query_start_time = time.time()
+    count = 0
     try:
-        print("Executing SQL query to fetch nodes...")
-        query_start_time = time.time()
-
-        with connection.cursor() as cursor:
-            cursor.execute(f"""
-                SELECT id, lat / 1e7 AS latitude, lon / 1e7 AS longitude, tags
-                FROM planet_osm_nodes
-                WHERE ST_Intersects(
-                    ST_SetSRID(ST_MakePoint(lon / 1e7, lat / 1e7), 4326),
-                    ST_MakeEnvelope({case_study_bbox[0]}, {case_study_bbox[1]}, {case_study_bbox[2]}, {case_study_bbox[3]}, 4326)
-                )
-                LIMIT 2000;
-            """)
-            node_rows = cursor.fetchall()
-
-        print(f"SQL query executed. Time: {time.time() - query_start_time:.2f} seconds")
-        print(f"Number of nodes fetched: {len(node_rows)}")
-
-        print("Processing node data...")
-        for row in node_rows:
-            tags = row[3]
+        for node_id, latitude, longitude, tags in iter_nodes(viewport, limit=2000):
             # Ensure tags is a dict. If it's a JSON string, parse it.
             if isinstance(tags, str):
                 try:
@@ -414,25 +242,35 @@ def map_nodes(request):
             elif not isinstance(tags, dict):
                 tags = {} # Default to empty dict if not a string or dict
 
-            node_data.append({
-                "id": row[0],
-                "latitude": float(row[1]),
-                "longitude": float(row[2]),
+            count += 1
+            yield json.dumps({
+                "id": node_id,
+                "latitude": float(latitude),
+                "longitude": float(longitude),
                 "tags": tags
             })
-
     except Exception as e:
-        print(f"Error fetching or processing node data in map_nodes: {e}")
-        return JsonResponse({"error": f"Error fetching node data: {e}"}, status=500)
+        # Headers are already sent; abort the response rather than end it as valid JSON
+        print(f"Error streaming node data in nodes_data: {e}")
+        raise
+    print(f"Streamed {count} nodes in {time.time() - query_start_time:.2f} seconds")
 
+@require_GET
+def nodes_data(request):
+    """
+    Streams the tagged OSM nodes (see osm_queries.nodes_sql) within the requested bbox
+    (?bbox=min_lng,min_lat,max_lng,max_lat, defaulting to the case-study area) as JSON.
+    Like the planet_osm_* tile layers, the node table is treated as a static
+    import, so the ETag is derived from the viewport and a repeat request is
+    answered with 304 without querying.
+    """
     try:
-        node_data_json = json.dumps(node_data)
-    except Exception as e:
-        print(f"Error during JSON serialization in map_nodes: {e}")
-        return JsonResponse({"error": "Error serializing node data."}, status=500)
+        viewport = parse_viewport(request, default=CASE_STUDY_BBOX)
+    except ValueError as e:
+        return JsonResponse({"error": f"Invalid viewport: {e}"}, status=400)
 
-    print(f"map_nodes view completed. Total time: {time.time() - start_time:.2f} seconds")
-    return render(request, "map_nodes.html", {"node_data_json": node_data_json})
+    etag = f'"nodes-{viewport.key}"'
+    return _conditional_response(request, etag, json_array_chunks(_node_items(viewport)))
 
 # ---
 # 7. ShortestPathForm and university_roads (Internal Pathfinding)
@@ -452,9 +290,9 @@ def university_roads(request):
     print("Starting university_roads view...")
     start_time = time.time()
 
-    # Build graph from CachedRoads
-    G, road_data = _build_networkx_graph_from_cached_roads(CachedRoad.objects.all())
-    print(f"Graph built with {G.number_of_nodes()} nodes and {G.number_of_edges()} edges.")
+    # Reuse this worker's routing graph; it is only rebuilt when CachedRoad changes
+    G = graph_store.get()
+    print(f"Graph has {G.number_of_nodes()} nodes and {G.number_of_edges()} edges.")
 
     shortest_path_geojson = None
     form = ShortestPathForm(request.POST or None)
@@ -465,48 +303,51 @@ def university_roads(request):
         end_lat = form.cleaned_data["end_lat"]
         end_lng = form.cleaned_data["end_lng"]
 
-        try:
-            if not G.nodes():
-                return render(request, "error.html", {"message": "No road data available to calculate path. Graph is empty."})
-
-            start_point = ShapelyPoint(start_lng, start_lat)
-            end_point = ShapelyPoint(end_lng, end_lat)
-            
-            graph_nodes_shapely = ShapelyMultiPoint([ShapelyPoint(node) for node in G.nodes()])
-
-            # Find the nearest nodes in the graph to the start and end points
-            _, nearest_start_shapely = nearest_points(start_point, graph_nodes_shapely)
-            _, nearest_end_shapely = nearest_points(end_point, graph_nodes_shapely)
-
-            nearest_start_node_tuple = tuple(nearest_start_shapely.coords[0])
-            nearest_end_node_tuple = tuple(nearest_end_shapely.coords[0])
-
-            # Ensure found nearest nodes are actually in the graph
-            if nearest_start_node_tuple not in G:
-                print(f"Warning: Nearest start node {nearest_start_node_tuple} not found in graph nodes after nearest_points.")
-                return render(request, "error.html", {"message": "Could not find a valid start point on the map."})
-            if nearest_end_node_tuple not in G:
-                print(f"Warning: Nearest end node {nearest_end_node_tuple} not found in graph nodes after nearest_points.")
-                return render(request, "error.html", {"message": "Could not find a valid end point on the map."})
-
-            path = nx.shortest_path(G, source=nearest_start_node_tuple, target=nearest_end_node_tuple, weight="weight")
-            path_coords = [list(coord) for coord in path]
-            print(f"Shortest path calculated with {len(path_coords)} points.")
+        # Hold the graph lock so a concurrent add_path cannot mutate G mid-search
+        with graph_store.lock:
+            try:
+                if not G.nodes():
+                    return render(request, "error.html", {"message": "No road data available to calculate path. Graph is empty."})
 
-            shortest_path_geojson = {
-                "type": "LineString",
-                "coordinates": path_coords
-            }
+                # Find the nearest nodes in the graph to the start and end points
+                nearest_start_node_tuple, nearest_end_node_tuple = graph_store.node_index().nearest_many(
+                    [(start_lng, start_lat), (end_lng, end_lat)]
+                )
 
-        except nx.NetworkXNoPath:
-            print("No path found between the given points.")
-            return render(request, "error.html", {"message": "No path found between the given points."})
-        except Exception as e:
-            print(f"Error calculating shortest path in university_roads: {e}")
-            return render(request, "error.html", {"message": f"Error calculating shortest path: {e}"})
+                # Ensure found nearest nodes are actually in the graph
+                if nearest_start_node_tuple not in G:
+                    print(f"Warning: Nearest start node {nearest_start_node_tuple} not found in graph nodes after snapping.")
+                    return render(request, "error.html", {"message": "Could not find a valid start point on the map."})
+                if nearest_end_node_tuple not in G:
+                    print(f"Warning: Nearest end node {nearest_end_node_tuple} not found in graph nodes after snapping.")
+                    return render(request, "error.html", {"message": "Could not find a valid end point on the map."})
+
+                if settings.ROUTING_ENGINE == "csr":
+                    # A* over the array-backed graph
+                    path_coords = graph_store.csr_graph().shortest_path(nearest_start_node_tuple, nearest_end_node_tuple)
+                else:
+                    # Search the junction-only graph and expand geometry for the result
+                    contracted = graph_store.contracted_graph()
+                    with contracted.endpoints(nearest_start_node_tuple, nearest_end_node_tuple):
+                        path = nx.shortest_path(contracted.graph, source=nearest_start_node_tuple, target=nearest_end_node_tuple, weight="weight")
+                        path_coords = contracted.expand(path)
+                print(f"Shortest path calculated with {len(path_coords)} points.")
+
+                shortest_path_geojson = {
+                    "type": "LineString",
+                    "coordinates": round_coordinates(path_coords),
+                    "distance": path_length(path_coords),
+                    "distance_unit": WEIGHT_UNIT
+                }
+
+            except nx.NetworkXNoPath:
+                print("No path found between the given points.")
+                return render(request, "error.html", {"message": "No path found between the given points."})
+            except Exception as e:
+                print(f"Error calculating shortest path in university_roads: {e}")
+                return render(request, "error.html", {"message": f"Error calculating shortest path: {e}"})
 
     try:
-        road_data_json = json.dumps(road_data)
         shortest_path_json_str = json.dumps(shortest_path_geojson) if shortest_path_geojson else "null"
     except Exception as e:
         print(f"Error serializing data for template in university_roads: {e}")
@@ -514,7 +355,6 @@ def university_roads(request):
 
     print(f"university_roads view completed. Total time: {time.time() - start_time:.2f} seconds")
     return render(request, "university_roads.html", {
-        "road_data_json": road_data_json,
         "shortest_path_json": shortest_path_json_str,
         "form": form
     })
@@ -527,7 +367,9 @@ def university_roads(request):
 def add_path(request):
     """
     View to add a new path (drawn by user) to the CachedRoad model.
-    Ensures geometry is stored as a JSON string.
+    The GeoJSON string is stored in CachedRoad's LineString column. The path
+    gets a negative osm_id from a sequence and is spliced into this worker's
+    routing graph where it crosses existing roads (see graph_store).
     """
     if request.method == 'POST':
         try:
@@ -538,15 +380,14 @@ def add_path(request):
             if not coordinates or len(coordinates) < 2:
                 return JsonResponse({'error': 'Invalid coordinates. At least two points are required.'}, status=400)
 
-            max_osm_id = CachedRoad.objects.aggregate(Max('osm_id'))['osm_id__max'] or 0
-            osm_id = max_osm_id + 1
+            osm_id = CachedRoad.next_user_path_id()
 
             geojson_geometry_dict = {
                 "type": "LineString",
                 "coordinates": coordinates
             }
             
-            # Store it as a JSON string in the database
+            # GEOS parses the GeoJSON string into the LineString column
             geojson_geometry_string = json.dumps(geojson_geometry_dict)
 
             CachedRoad.objects.create(osm_id=osm_id, name=name, geometry=geojson_geometry_string)
@@ -567,7 +408,8 @@ def add_path(request):
 def remove_paths(request):
     """
     View to remove paths from the CachedRoad model.
-    Can remove a specific path by osm_id or all paths.
+    Can remove a specific path by osm_id, which drops only that path's edges
+    from the routing graph, or all paths.
     """
     if request.method == 'POST':
         try:
@@ -581,7 +423,14 @@ def remove_paths(request):
                 else:
                     return JsonResponse({'error': f'No path found with osm_id {osm_id}.'}, status=404)
             else:
-                CachedRoad.objects.all().delete()
+                # One DELETE without the per-row post_delete receivers (a version bump and
+                # a graph edit per road); bump once and rebuild the graph instead
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(f"DELETE FROM {CachedRoad._meta.db_table}")
+                    # Cleared on purpose; the next visit refills it from the OSM tables
+                    CachedDataset.clear_fill(CachedDataset.ROADS)
+                    CachedDataset.bump(CachedDataset.ROADS)
+                graph_store.invalidate()
                 return JsonResponse({'message': 'All paths removed successfully.'}, status=200)
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON in request body.'}, status=400)
@@ -598,81 +447,22 @@ def remove_paths(request):
 @csrf_exempt
 def university_blocks(request):
     """
-    Fetches and saves building blocks within the specified bounding box into DITCachedBuildings.
-    Uses cached data if available. Ensures geometry is stored as a JSON string.
+    Displays the building blocks cached in DITCachedBuildings; the page fetches them from buildings_data.
+    Until the cache has been filled (recorded on its CachedDataset row), it is
+    warmed in the background (see cache_fill).
     """
     print("Starting university_blocks view...")
-    case_study_bbox = (39.273264, -6.817276, 39.288407, -6.807517)
 
-    block_data = []
-    cached_blocks_count = DITCachedBuildings.objects.count()
-
-    if cached_blocks_count >= 2000: # Use cached data if enough blocks are present
+    if ensure_warm(CachedDataset.BUILDINGS):
         print("Using cached building blocks...")
-        for block_obj in DITCachedBuildings.objects.all():
-            geom_dict = _get_geojson_from_db_result(block_obj.geometry)
-            if geom_dict:
-                block_data.append({
-                    "osm_id": block_obj.osm_id,
-                    "name": block_obj.name,
-                    "geometry": geom_dict # Keep as dict for template
-                })
-            else:
-                print(f"Warning: Malformed geometry in DITCachedBuildings {block_obj.osm_id}. Skipping.")
-                # Option to delete malformed entry: block_obj.delete()
     else:
-        print("Executing SQL query to fetch building blocks and populate cache...")
-        try:
-            with connection.cursor() as cursor:
-                cursor.execute(f"""
-                    SELECT osm_id, name, landuse, building, ST_AsGeoJSON(ST_Transform(way, 4326)) AS geometry
-                    FROM planet_osm_polygon
-                    WHERE building IS NOT NULL
-                    AND ST_Intersects(
-                        ST_Transform(way, 4326),
-                        ST_MakeEnvelope({case_study_bbox[0]}, {case_study_bbox[1]}, {case_study_bbox[2]}, {case_study_bbox[3]}, 4326)
-                    )
-                    LIMIT 5000;
-                """)
-                block_rows = cursor.fetchall()
-
-            print(f"Number of blocks fetched: {len(block_rows)}")
-            print("Saving queried blocks to the database cache...")
-
-            for row in block_rows:
-                geometry_string = row[4] # ST_AsGeoJSON returns a string
-                geom_dict = _get_geojson_from_db_result(geometry_string)
-                if geom_dict:
-                    DITCachedBuildings.objects.update_or_create(
-                        osm_id=row[0],
-                        defaults={"name": row[1], "geometry": geometry_string}
-                    )
-                    block_data.append({
-                        "osm_id": row[0],
-                        "name": row[1] or "Unnamed Block",
-                        "geometry": geom_dict # Convert back to dict for template
-                    })
-                else:
-                    print(f"Warning: Geometry for OSM ID {row[0]} is malformed after DB fetch. Skipping save.")
-
-        except Exception as e:
-            print(f"Error during SQL query execution for university_blocks: {e}")
-            return render(request, "error.html", {"message": "Error fetching building blocks."})
-
-    try:
-        block_data_json = json.dumps(block_data)
-        print("Block data serialized successfully.")
-    except Exception as e:
-        print(f"Error during JSON serialization in university_blocks: {e}")
-        return render(request, "error.html", {"message": "Error serializing block data."})
+        print("Building cache has not been filled yet; warming it in the background...")
 
-    return render(request, "university_blocks.html", {"block_data_json": block_data_json})
+    return render(request, "university_blocks.html")
 
 # ---
 # 11. university_blocks_roads (Combined View with Pathfinding)
 # ---
-from shapely.geometry import Point as ShapelyPoint, MultiPoint as ShapelyMultiPoint
-from shapely.ops import nearest_points
 import networkx as nx
 import json
 
@@ -683,19 +473,9 @@ def university_blocks_roads(request):
     """
     print("Starting university_blocks_roads view...")
 
-    # Fetch buildings
-    buildings = DITCachedBuildings.objects.all()
-    building_data = []
-    for b in buildings:
-        geom_dict = _get_geojson_from_db_result(b.geometry)
-        if geom_dict:
-            building_data.append({"osm_id": b.osm_id, "name": b.name, "geometry": geom_dict})
-        else:
-            print(f"Warning: Malformed geometry in DITCachedBuildings {b.osm_id}. Skipping.")
-
-    # Fetch roads and build graph
-    G, road_data = _build_networkx_graph_from_cached_roads(CachedRoad.objects.all())
-    print(f"Graph built with {G.number_of_nodes()} nodes and {G.number_of_edges()} edges.")
+    # Fetch this worker's routing graph; the page fetches roads and buildings from the data endpoints
+    G = graph_store.get()
+    print(f"Graph has {G.number_of_nodes()} nodes and {G.number_of_edges()} edges.")
 
     # Get start and end coordinates
     start_lat = request.GET.get("start_lat")
@@ -703,60 +483,230 @@ def university_blocks_roads(request):
     end_lat = request.GET.get("end_lat")
     end_lng = request.GET.get("end_lng")
 
+    # Optional ?max_routes=N, capped by settings.ALTERNATIVE_ROUTES_MAX
+    try:
+        max_routes = int(request.GET.get("max_routes", settings.ALTERNATIVE_ROUTES_MAX))
+    except ValueError:
+        max_routes = settings.ALTERNATIVE_ROUTES_MAX
+    max_routes = max(1, min(max_routes, settings.ALTERNATIVE_ROUTES_MAX))
+
     routes_geojson = []
 
     if start_lat and start_lng and end_lat and end_lng:
-        try:
-            if not G.nodes():
-                print("Graph is empty, no routes.")
-            else:
-                start_point = ShapelyPoint(float(start_lng), float(start_lat))
-                end_point = ShapelyPoint(float(end_lng), float(end_lat))
-
-                graph_nodes_shapely = ShapelyMultiPoint([ShapelyPoint(node) for node in G.nodes()])
-                _, nearest_start_shapely = nearest_points(start_point, graph_nodes_shapely)
-                _, nearest_end_shapely = nearest_points(end_point, graph_nodes_shapely)
-
-                start_node = tuple(nearest_start_shapely.coords[0])
-                end_node = tuple(nearest_end_shapely.coords[0])
-
-                if start_node not in G or end_node not in G:
-                    print(f"Start or end node not in graph: {start_node}, {end_node}")
+        # Hold the graph lock so a concurrent add_path cannot mutate G mid-search
+        with graph_store.lock:
+            try:
+                if not G.nodes():
+                    print("Graph is empty, no routes.")
                 else:
-                    # Generate multiple simple paths (limit to avoid overload)
-                    all_routes_gen = nx.shortest_simple_paths(G, start_node, end_node, weight='weight')
-                    max_routes = 5  # limit to 5 routes for performance
-                    for idx, route in enumerate(all_routes_gen):
-                        coords = [list(coord) for coord in route]
-                        routes_geojson.append({
-                            "type": "LineString",
-                            "coordinates": coords
-                        })
-                        if idx + 1 >= max_routes:
-                            break
-                    print(f"Calculated {len(routes_geojson)} routes.")
-
-        except nx.NetworkXNoPath:
-            print("No path found between the given points.")
-        except Exception as e:
-            print(f"Error calculating routes: {e}")
+                    start_node, end_node = graph_store.node_index().nearest_many(
+                        [(float(start_lng), float(start_lat)), (float(end_lng), float(end_lat))]
+                    )
+
+                    if start_node not in G or end_node not in G:
+                        print(f"Start or end node not in graph: {start_node}, {end_node}")
+                    else:
+                        # Generate alternative routes on the junction-only graph within the time budget
+                        contracted = graph_store.contracted_graph()
+                        with contracted.endpoints(start_node, end_node):
+                            routes = alternative_routes(
+                                contracted.graph, start_node, end_node,
+                                max_routes=max_routes,
+                                time_budget=settings.ALTERNATIVE_ROUTES_TIME_BUDGET,
+                            )
+                            for route in routes:
+                                coords = contracted.expand(route)
+                                routes_geojson.append({
+                                    "type": "LineString",
+                                    "coordinates": round_coordinates(coords),
+                                    "distance": path_length(coords),
+                                    "distance_unit": WEIGHT_UNIT
+                                })
+                        print(f"Calculated {len(routes_geojson)} routes.")
+
+            except nx.NetworkXNoPath:
+                print("No path found between the given points.")
+            except Exception as e:
+                print(f"Error calculating routes: {e}")
 
     try:
-        road_data_json = json.dumps(road_data)
-        building_data_json = json.dumps(building_data)
         routes_json_str = json.dumps(routes_geojson)
     except Exception as e:
         print(f"Error serializing data: {e}")
         return render(request, "error.html", {"message": "Error preparing map data for display."})
 
     return render(request, "university_blocks_roads.html", {
-        "road_data_json": road_data_json,
-        "building_data_json": building_data_json,
         "routes_json": routes_json_str
     })
 
 
 
+# ---
+# 12. Data endpoints (JSON fetched by the map templates, with ETag / conditional GET)
+# ---
+
+def _if_none_match(request, etag):
+    """True when the request's If-None-Match header matches ``etag``."""
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+def _conditional_response(request, etag, body, encoding=None, content_type="application/json"):
+    """
+    Answers with 304 Not Modified when the client already holds ``etag``,
+    otherwise with ``body`` (bytes, or an iterator of byte chunks to stream).
+    Sets ETag, Cache-Control and Vary.
+    """
+    if _if_none_match(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        if isinstance(body, bytes):
+            response = HttpResponse(body, content_type=content_type)
+        else:
+            response = StreamingHttpResponse(body, content_type=content_type)
+        if encoding:
+            response["Content-Encoding"] = encoding
+    response["ETag"] = etag
+    response["Cache-Control"] = f"public, max-age={settings.DATA_CACHE_MAX_AGE}, must-revalidate"
+    response["Vary"] = "Accept-Encoding"
+    return response
+
+def _accepted_encodings(request):
+    """Content codings the client accepts (q > 0) from its Accept-Encoding header."""
+    accepted = set()
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+def _payload_response(request, name):
+    """
+    Serves a cached dataset: the whole cached Payload, or with ?bbox= only the
+    rows in that viewport. ?zoom= picks the level of detail either way. ?format=topojson returns
+    a quantized TopoJSON Topology instead of the GeoJSON-geometry list.
+    Answers 503 "warming" while a dataset that was never filled and has no
+    rows is filled in the background. The strong ETag is derived from the dataset version, the
+    format, the viewport and the content coding (each coding
+    is a different representation), so it only changes when the data does, and
+    a matching viewport request is answered with 304 before any query runs.
+    """
+    try:
+        viewport = parse_viewport(request)
+    except ValueError as e:
+        return JsonResponse({"error": f"Invalid viewport: {e}"}, status=400)
+    output_format = request.GET.get("format", "json")
+    if output_format not in SERIALIZERS:
+        return JsonResponse({"error": f"Unknown format '{output_format}'; use one of {', '.join(SERIALIZERS)}."}, status=400)
+    if not ensure_warm(name):
+        wait = retry_after(name)
+        if wait:
+            # The last fill failed; clients back off until it may be retried
+            response = JsonResponse({"status": "failed", "message": f"Filling the {name} cache failed; retrying later."}, status=503)
+            response["Retry-After"] = str(wait)
+            return response
+        # The cache is being filled in the background; clients retry after Retry-After
+        response = JsonResponse({"status": "warming", "message": f"The {name} cache is being filled."}, status=503)
+        response["Retry-After"] = "2"
+        return response
+    accepted = _accepted_encodings(request)
+    encoding = next((coding for coding in ENCODINGS if coding in accepted), None)
+
+    if viewport is None:
+        zoom = parse_zoom(request)  # Already validated by parse_viewport
+        payload = payload_cache.get(name, output_format, zoom)
+        etag = f'"{name}-v{payload.version}-{output_format}-{lod_column(zoom)}-{encoding or "identity"}"'
+        return _conditional_response(request, etag, payload.body(encoding), encoding)
+
+    # Viewport responses are not cached server-side; stream them as rows are read
+    version = CachedDataset.current_version(name)
+    etag = f'"{name}-v{version}-{output_format}-{viewport.key}-{encoding or "identity"}"'
+    if _if_none_match(request, etag):
+        return _conditional_response(request, etag, b"", encoding)
+    if output_format == "topojson":
+        # The Topology's transform depends on every feature, so it is built whole
+        body = b"".join(compressed_chunks([dataset_topology(name, viewport)], encoding))
+    else:
+        body = compressed_chunks(json_array_chunks(dataset_items(name, viewport)), encoding)
+    return _conditional_response(request, etag, body, encoding)
+
+@require_GET
+def roads_data(request):
+    """
+    Returns the cached roads (CachedRoad) as JSON (or ?format=topojson), optionally limited to ?bbox= and simplified for ?zoom=.
+    """
+    return _payload_response(request, CachedDataset.ROADS)
+
+@require_GET
+def buildings_data(request):
+    """
+    Returns the cached buildings (DITCachedBuildings) as JSON (or ?format=topojson), optionally limited to ?bbox= and simplified for ?zoom=.
+    """
+    return _payload_response(request, CachedDataset.BUILDINGS)
+
+
+@require_GET
+def osm_features(request, layer):
+    """
+    Returns a planet_osm_* layer (see osm_queries.OSM_LAYERS) within ?bbox=
+    (default: the case-study area) as a GeoJSON FeatureCollection. PostGIS
+    encodes the whole collection and its bytes are passed straight through.
+    """
+    if layer not in OSM_LAYERS:
+        return JsonResponse({"error": f"Unknown OSM layer '{layer}'."}, status=404)
+    try:
+        viewport = parse_viewport(request, default=CASE_STUDY_BBOX)
+    except ValueError as e:
+        return JsonResponse({"error": f"Invalid viewport: {e}"}, status=400)
+
+    # The planet_osm_* tables are static imports (as for the tile layers)
+    accepted = _accepted_encodings(request)
+    encoding = next((coding for coding in ENCODINGS if coding in accepted), None)
+    etag = f'"osm-{layer}-{viewport.key}-{encoding or "identity"}"'
+    if _if_none_match(request, etag):
+        return _conditional_response(request, etag, b"", encoding)
+    try:
+        collection = fetch_json(feature_collection_sql(layer, viewport, OSM_LAYERS[layer]["limit"]), viewport)
+    except Exception as e:
+        print(f"Error fetching OSM layer {layer}: {e}")
+        return JsonResponse({"error": f"Error fetching OSM layer: {e}"}, status=500)
+    body = b"".join(compressed_chunks([collection.encode("utf-8")], encoding))
+    return _conditional_response(request, etag, body, encoding, content_type="application/geo+json")
+
+
+# ---
+# 13. Vector tiles (MVT)
+# ---
+
+@require_GET
+def vector_tile(request, layer, z, x, y):
+    """
+    Returns one Mapbox Vector Tile of ``layer`` (see tiles.TILE_LAYERS),
+    encoded by PostGIS and cached per dataset version.
+    """
+    if layer not in TILE_LAYERS:
+        return JsonResponse({"error": f"Unknown tile layer '{layer}'."}, status=404)
+    if not tile_is_valid(z, x, y):
+        return JsonResponse({"error": f"Invalid tile {z}/{x}/{y}."}, status=400)
+    try:
+        version, tile = tile_cache.get(layer, z, x, y)
+    except Exception as e:
+        print(f"Error encoding tile {layer}/{z}/{x}/{y}: {e}")
+        return JsonResponse({"error": f"Error encoding tile: {e}"}, status=500)
+
+    etag = f'"{layer}-v{version}-{z}-{x}-{y}"'
+    return _conditional_response(request, etag, tile, content_type="application/vnd.mapbox-vector-tile")
+
+
 def index(request):
     """
     View to render the index page for QR code scanning.
@@ -796,37 +746,33 @@ def fetch_destinations(request):
 
 # The code builds a NetworkX graph where:
 # - Each node is a coordinate tuple (longitude, latitude) from the road geometries (i.e., every point along every road linestring).
-# - Edges are created between consecutive points along each road, with weights equal to their geometric distance.
+# - Edges are created between consecutive points along each road, with weights equal to their great-circle distance in metres
+#   (vectorized haversine in geodesy.py). Routes report their total "distance" in the same unit.
 
 # When calculating the shortest path:
-# - The nearest node in the graph to the start and end coordinates is found (using Shapely's nearest_points).
-# - The shortest path is computed between these two nodes using NetworkX.
-
-# Therefore:
-# - The "nodes" in the graph are not special "switching points" or "routing points" (like intersections or junctions).
-# - They are simply all the points (vertices) that make up the road polylines.
-# - The path can "switch" at any of these points, not just at intersections.
-
-# If you want only intersections/junctions as routing points, you would need to preprocess the road data to extract only those points as graph nodes.
+# - The nearest node in the graph to the start and end coordinates is found (using the NodeIndex STRtree in spatial_index.py).
+# - The search runs on a ContractedGraph (graph_contraction.py) where chains of degree-2 vertices are collapsed
+#   into single edges, so only intersections/junctions and dead ends are nodes.
+# - The resulting junction path is expanded back to every road vertex before it is returned as GeoJSON.
 
 # To get all recently added roads (e.g., via the add_path view), you can add a simple Django view to list them.
-# Example: List the most recent N CachedRoads, ordered by osm_id descending.
-
-from django.views.decorators.http import require_GET
+# Example: List the most recent N user paths in CachedRoad.
 
 @require_GET
 def recent_added_roads(request):
     """
-    Returns the most recently added roads in CachedRoad as JSON.
+    Streams the most recently added user paths in CachedRoad as JSON (their
+    negative osm_ids count down, so the newest comes first in osm_id order).
     """
     N = int(request.GET.get("limit", 10))  # Default to 10, can override with ?limit=20
-    roads = CachedRoad.objects.order_by('-osm_id')[:N]
-    data = [
-        {
-            "osm_id": road.osm_id,
-            "name": road.name,
-            "geometry": road.geometry,
-        }
-        for road in roads
-    ]
-    return JsonResponse(data, safe=False)
\ No newline at end of file
+    roads = (
+        CachedRoad.objects.filter(osm_id__lt=0).order_by('osm_id')
+        .annotate(geojson=AsGeoJSON("geometry", precision=settings.GEOJSON_PRECISION))
+        .values_list("osm_id", "name", "geojson")[:N]
+    )
+    items = (
+        # "geometry" stays a GeoJSON string, as stored before
+        json.dumps({"osm_id": osm_id, "name": name, "geometry": geojson})
+        for osm_id, name, geojson in roads.iterator(chunk_size=2000)
+    )
+    return StreamingHttpResponse(json_array_chunks(items), content_type="application/json")
@@ -0,0 +1,58 @@
+"""
+Dissolved walkable-area layer.
+
+The buffered road polygons overlap wherever roads meet, and drawing each of
+them means thousands of shapes on the client. ``build_walkable_area`` unions
+them once into a single MultiPolygon and stores it at several levels of
+detail (WalkableArea rows), each simplified to half a pixel at its
+``min_zoom``; ``walkable_area_for_zoom`` picks the level sized for a zoom.
+"""
+from django.conf import settings
+from django.contrib.gis.db.models.functions import AsGeoJSON
+from django.db import connection, transaction
+
+from .models import BufferedRoad, WalkableArea
+from .viewport import pixel_tolerance
+
+# Zoom levels a simplified copy is stored for; the last is the most detailed
+LOD_ZOOMS = (10, 12, 14, 16, 18)
+
+
+def build_walkable_area(zooms=LOD_ZOOMS):
+    """
+    Replaces the WalkableArea levels with the current BufferedRoad polygons,
+    unioned once and then simplified per zoom in ``zooms``, in one statement.
+    Returns the number of levels written (0 when there are no polygons).
+    """
+    table = WalkableArea._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table}")
+        # MATERIALIZED: the union runs once, not once per level
+        cursor.execute(f"""
+            WITH dissolved AS MATERIALIZED (
+                SELECT ST_Union(geom) AS geom, count(*) AS source_rows
+                FROM {BufferedRoad._meta.db_table}
+            )
+            INSERT INTO {table} (min_zoom, tolerance, source_rows, built_at, geometry)
+            SELECT z.min_zoom, z.tolerance, d.source_rows, now(),
+                   ST_Multi(ST_CollectionExtract(ST_MakeValid(
+                       ST_SimplifyPreserveTopology(d.geom, z.tolerance)
+                   ), 3))
+            FROM dissolved d
+            CROSS JOIN unnest(%s::integer[], %s::double precision[]) AS z(min_zoom, tolerance)
+            WHERE d.geom IS NOT NULL
+        """, [list(zooms), [pixel_tolerance(zoom) for zoom in zooms]])
+        return cursor.rowcount
+
+
+def walkable_area_for_zoom(zoom=None):
+    """
+    The WalkableArea level to draw at ``zoom`` (the most detailed when None),
+    with its GeoJSON as ``geojson``; None until build_walkable_area has run.
+    """
+    levels = WalkableArea.objects.order_by("min_zoom").annotate(
+        geojson=AsGeoJSON("geometry", precision=settings.GEOJSON_PRECISION)
+    ).defer("geometry")
+    if zoom is None:
+        return levels.last()
+    return levels.filter(min_zoom__lte=zoom).last() or levels.first()
@@ -160,6 +160,33 @@ EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Routing engine used by the university_roads view:
+# 'networkx' (contracted NetworkX graph) or 'csr' (NumPy CSR arrays with A*)
+ROUTING_ENGINE = os.getenv('ROUTING_ENGINE', 'networkx').lower()
+
+# Alternative routes in university_blocks_roads: maximum number of routes and
+# the time budget (seconds) spent looking for them
+ALTERNATIVE_ROUTES_MAX = int(os.getenv('ALTERNATIVE_ROUTES_MAX', '5'))
+ALTERNATIVE_ROUTES_TIME_BUDGET = float(os.getenv('ALTERNATIVE_ROUTES_TIME_BUDGET', '0.5'))
+
+# max-age (seconds) sent with the JSON data endpoints; clients revalidate with
+# If-None-Match after it expires
+DATA_CACHE_MAX_AGE = int(os.getenv('DATA_CACHE_MAX_AGE', '0'))
+
+# SRID of the osm2pgsql planet_osm_* geometry columns (3857 unless imported with --latlong)
+OSM_SRID = int(os.getenv('OSM_SRID', '3857'))
+
+# Vector tile cache: optional on-disk directory shared by workers, and the
+# number of tiles each worker keeps in memory
+TILE_CACHE_DIR = os.getenv('TILE_CACHE_DIR', '')
+TILE_CACHE_MAX_ENTRIES = int(os.getenv('TILE_CACHE_MAX_ENTRIES', '2048'))
+
+# Decimal digits kept in served GeoJSON coordinates (6 digits is ~0.1 m)
+GEOJSON_PRECISION = int(os.getenv('GEOJSON_PRECISION', '6'))
+
+# Grid size per axis (positions across the data's bbox) for ?format=topojson output
+TOPOJSON_QUANTIZATION = int(os.getenv('TOPOJSON_QUANTIZATION', '100000'))
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [